@@ -1,8 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from aiogram import Bot, Dispatcher
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
-from auxy.settings import TELEGRAM_BOT_API_TOKEN
+from auxy.settings import TELEGRAM_BOT_API_TOKEN, TELEGRAM_GLOBAL_RATE_LIMIT, TELEGRAM_CHAT_RATE_LIMIT, \
+    REPORT_RENDER_EXECUTOR, REPORT_RENDER_WORKERS, REPORT_CACHE_SIZE, PROJECT_CACHE_SIZE, PROJECT_CACHE_TTL, \
+    PROJECT_CACHE_NEGATIVE_TTL, USER_CACHE_SIZE, USER_CACHE_TTL, CHAT_CACHE_SIZE, CHAT_CACHE_TTL
+from auxy.throttling import TelegramThrottler
+from auxy.reports import ReportCache
+from auxy.cache import TTLCache
 
 
 bot = Bot(token=TELEGRAM_BOT_API_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(bot, storage=storage)
+throttler = TelegramThrottler(TELEGRAM_GLOBAL_RATE_LIMIT, TELEGRAM_CHAT_RATE_LIMIT)
+if REPORT_RENDER_EXECUTOR == 'process':
+    report_executor = ProcessPoolExecutor(REPORT_RENDER_WORKERS)
+else:
+    report_executor = ThreadPoolExecutor(REPORT_RENDER_WORKERS, thread_name_prefix='report')
+report_cache = ReportCache(REPORT_CACHE_SIZE)
+# projects by chat ids, handlers get them as the ``project`` argument
+project_cache = TTLCache(PROJECT_CACHE_SIZE, PROJECT_CACHE_TTL, PROJECT_CACHE_NEGATIVE_TTL)
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+chat_cache = TTLCache(CHAT_CACHE_SIZE, CHAT_CACHE_TTL)
@@ -1,25 +1,30 @@
 import logging
 import enum
 import asyncio
-from datetime import datetime
-from dateutil.relativedelta import relativedelta, WE
-from sqlalchemy.future import select
 from aiogram import executor, types
 from aiogram.utils.emoji import emojize
 from aiogram.utils.markdown import text
 from aiogram.contrib.middlewares.logging import LoggingMiddleware
 from aiogram.dispatcher.filters import Text, HashTag
 from aiogram.dispatcher import FSMContext
-from auxy.settings import WHITELISTED_USERS, WHITELISTED_CHATS
-from auxy.db import OrmSession
-from auxy.db.models import User, Chat, Project
-from .middleware import WhitelistMiddleware, GetOrCreateChatMiddleware, GetOrCreateUserMiddleware
-from auxy.utils import get_bulleted_items_list_from_message, generate_grid, PeriodBucket, PeriodBucketModes
+from sqlalchemy.ext.asyncio import AsyncSession
+from auxy.settings import WHITELISTED_USERS, WHITELISTED_CHATS, REPORT_RENDER_OFFLOAD_THRESHOLD, REPORT_SPOOL_MAX_SIZE, \
+    REPORT_CACHE_MAX_DOCUMENT_SIZE, REPORT_PAGE_SIZE
+from auxy.db.models import User, Project
+from .middleware import WhitelistMiddleware, UpdateSessionMiddleware, GetOrCreateChatMiddleware, \
+    GetOrCreateUserMiddleware, GetProjectMiddleware
+from auxy.utils import get_bulleted_items_list_from_message, PeriodBucket, PeriodBucketModes
+from auxy.reports import ReportPeriods, BucketStats, SpooledReportFile, get_report_period, get_report_entries, \
+    has_items, write_status_report_pages, render_project_stats
+from auxy.exports import ExportFormats, get_export_format, write_jsonl
 from .blueprints.projects import updateprojectsettings, newproject
-from .background_tasks import notification_processing_loop
+from .background_tasks import notification_processing_loop, cache_stats_logging_loop, bucket_stats_recount_loop, \
+    run_forever
+from .outbox import outbox_sending_loop
 from .blueprints.item_logging import item_logging
 from .blueprints.item_status_changing import item_status_changing
-from . import dp
+from .blueprints.history_import import history_import
+from . import dp, report_executor, report_cache
 
 
 logging.basicConfig(level=logging.INFO)
@@ -66,106 +71,88 @@ async def help_(message: types.Message):
 
 
 @dp.message_handler(commands='todo')
-async def todo_for_today(message: types.Message, chat: Chat):
+async def todo_for_today(message: types.Message, project: Project, session: AsyncSession):
     dt = message.date
-    async with OrmSession() as session:
-        select_stmt = select(Project) \
-            .where(
-                Project.chat_id == chat.id
-            ) \
-            .order_by(Project.id)
-        projects_result = await session.execute(select_stmt)
-        project = projects_result.scalars().first()
-
-        bucket = PeriodBucket.new(project.period_bucket_mode, dt)
-        todo_list = await project.get_for_period(session, bucket, with_log_messages=True)
+    bucket = PeriodBucket.new(project.period_bucket_mode, project.to_local_time(dt))
+    todo_list = await project.get_for_period(session, bucket, with_log_messages=True)
+    if project.period_bucket_mode == PeriodBucketModes.daily:
+        period_bucket_word = 'на сегодня'
+    elif project.period_bucket_mode == PeriodBucketModes.onworkingdays:
+        period_bucket_word = 'на сегодня'
+    elif project.period_bucket_mode == PeriodBucketModes.weekly:
+        period_bucket_word = 'на текущую неделю'
+    elif project.period_bucket_mode == PeriodBucketModes.monthly:
+        period_bucket_word = 'в этом месяце'
+    elif project.period_bucket_mode == PeriodBucketModes.yearly:
+        period_bucket_word = 'в этом году'
+    else:
+        period_bucket_word = ''
+    if todo_list:
+        message_content = [
+            text('Вот, что вы', period_bucket_word, 'планировали:')
+            if period_bucket_word else
+            text('Вот, что вы планировали:'),
+            text('')
+        ]
+        for item in sorted(todo_list.items, key=lambda i: i.id):
+            message_content.append(text(':pushpin:', item.text))
+            for log_message in item.notes:
+                message_content.append(text('    :paperclip:', log_message.text))
+        message_content += [
+            text(''),
+            text('Все точно получится!')
+        ]
+    else:
+        message_content = [
+            text('Никаких планов нет.'),
+            # TODO предложение создать план и описание способа
+        ]
+    await message.answer(
+        emojize(text(*message_content, sep='\n')),
+        disable_web_page_preview=True,
+    )
+
+
+@dp.message_handler(commands='planned')
+async def todo_for_next_time(message: types.Message, project: Project, session: AsyncSession):
+    # TODO почти copy-paste, разобраться
+    dt = message.date
+    bucket = PeriodBucket.new(project.period_bucket_mode, project.to_local_time(dt)).get_next()
+    todo_list = await project.get_for_period(session, bucket)
+    if todo_list:
         if project.period_bucket_mode == PeriodBucketModes.daily:
-            period_bucket_word = 'на сегодня'
+            period_bucket_word = 'на следующий день'
         elif project.period_bucket_mode == PeriodBucketModes.onworkingdays:
-            period_bucket_word = 'на сегодня'
+            period_bucket_word = 'на следующий рабочий день'
         elif project.period_bucket_mode == PeriodBucketModes.weekly:
-            period_bucket_word = 'на текущую неделю'
+            period_bucket_word = 'на следующую неделю'
         elif project.period_bucket_mode == PeriodBucketModes.monthly:
-            period_bucket_word = 'в этом месяце'
+            period_bucket_word = 'на следующий месяц'
         elif project.period_bucket_mode == PeriodBucketModes.yearly:
-            period_bucket_word = 'в этом году'
+            period_bucket_word = 'в следующем году'
         else:
             period_bucket_word = ''
-        if todo_list:
-            message_content = [
-                text('Вот, что вы', period_bucket_word, 'планировали:')
-                if period_bucket_word else
-                text('Вот, что вы планировали:'),
-                text('')
-            ]
-            for item in sorted(todo_list.items, key=lambda i: i.id):
-                message_content.append(text(':pushpin:', item.text))
-                for log_message in item.notes:
-                    message_content.append(text('    :paperclip:', log_message.text))
-            message_content += [
-                text(''),
-                text('Все точно получится!')
-            ]
-        else:
-            message_content = [
-                text('Никаких планов нет.'),
-                # TODO предложение создать план и описание способа
-            ]
-        await message.answer(
-            emojize(text(*message_content, sep='\n')),
-            disable_web_page_preview=True,
-        )
-
-
-@dp.message_handler(commands='planned')
-async def todo_for_next_time(message: types.Message, chat: Chat):
-    # TODO почти copy-paste, разобраться
-    dt = message.date
-    async with OrmSession() as session:
-        select_stmt = select(Project) \
-            .where(
-                Project.chat_id == chat.id
-            ) \
-            .order_by(Project.id)
-        projects_result = await session.execute(select_stmt)
-        project = projects_result.scalars().first()
-
-        bucket = PeriodBucket.new(project.period_bucket_mode, dt).get_next()
-        todo_list = await project.get_for_period(session, bucket)
-        if todo_list:
-            if project.period_bucket_mode == PeriodBucketModes.daily:
-                period_bucket_word = 'на следующий день'
-            elif project.period_bucket_mode == PeriodBucketModes.onworkingdays:
-                period_bucket_word = 'на следующий рабочий день'
-            elif project.period_bucket_mode == PeriodBucketModes.weekly:
-                period_bucket_word = 'на следующую неделю'
-            elif project.period_bucket_mode == PeriodBucketModes.monthly:
-                period_bucket_word = 'на следующий месяц'
-            elif project.period_bucket_mode == PeriodBucketModes.yearly:
-                period_bucket_word = 'в следующем году'
-            else:
-                period_bucket_word = ''
-            message_content = [
-                text('Вот, что запланировано вами ', period_bucket_word, ':', sep='')
-                if period_bucket_word else
-                text('Вот, что запланировано вами:'),
-                text('')
-            ] + [
-                text(':pushpin: ' + item.text)
-                for item in sorted(todo_list.items, key=lambda i: i.id)
-            ] + [
-                text(''),
-                text('Но не отвлекайтесь, пожалуйста.')
-            ]
-        else:
-            message_content = [
-                text('Никаких планов нет.'),
-                # TODO предложение создать план и описание способа
-            ]
-        await message.answer(
-            emojize(text(*message_content, sep='\n')),
-            disable_web_page_preview=True,
-        )
+        message_content = [
+            text('Вот, что запланировано вами ', period_bucket_word, ':', sep='')
+            if period_bucket_word else
+            text('Вот, что запланировано вами:'),
+            text('')
+        ] + [
+            text(':pushpin: ' + item.text)
+            for item in sorted(todo_list.items, key=lambda i: i.id)
+        ] + [
+            text(''),
+            text('Но не отвлекайтесь, пожалуйста.')
+        ]
+    else:
+        message_content = [
+            text('Никаких планов нет.'),
+            # TODO предложение создать план и описание способа
+        ]
+    await message.answer(
+        emojize(text(*message_content, sep='\n')),
+        disable_web_page_preview=True,
+    )
 
 
 @dp.message_handler(commands='cancel', state='*')
@@ -179,175 +166,112 @@ async def cancel_command(message: types.Message, state: FSMContext):
         await message.reply('Ладно, не в этот раз', reply_markup=types.ReplyKeyboardRemove())
 
 
-@dp.message_handler(commands=['wsr', 'msr'])
-async def status_report(message: types.Message, chat: Chat):
-    if message.get_command() == '/wsr':
-        start_dt = message.date + relativedelta(weekday=WE(-1), hour=0, minute=0, second=0, microsecond=0)
-        end_dt = message.date + relativedelta(weekday=WE, hour=0, minute=0, second=0, microsecond=0) \
-                 - relativedelta(days=1)
-    else:
-        start_dt = message.date + relativedelta(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_dt = message.date + relativedelta(months=1, day=1, hour=0, minute=0, second=0, microsecond=0, days=-1)
-    grid = generate_grid(start_dt, end_dt)
-    grid = [[[i[0], i[1]] for i in week] for week in grid]
-
-    async with OrmSession() as session:
-        select_stmt = select(Project) \
-            .where(
-                Project.chat_id == chat.id
-            ) \
-            .order_by(Project.id)
-        projects_result = await session.execute(select_stmt)
-        project = projects_result.scalars().first()
-        from_period = PeriodBucket.new(project.period_bucket_mode, start_dt)
-
-        todo_lists = await project.get_since(session, from_period, with_log_messages=True)
-        message_content = []
-        for todo_list in todo_lists:
-            bucket = PeriodBucket.get_by_key(todo_list.period_bucket_key)
-            for todo_item in todo_list.items:
-                message_content.append(text(
-                    ':spiral_calendar_pad:', str(bucket),
-                    ':pushpin:', todo_item.text
-                ))
-                for log_message in todo_item.notes:
-                    message_content.append(text(':paperclip:', log_message.text))
-                message_content.append(text(''))
-
-            if bucket.start():
-                for week in grid:
-                    for i in week:
-                        if i[1].date() == bucket.start().date():
-                            i[0] = i[0].replace('white', 'purple')
-
-        import io
-        file = io.StringIO(emojize(text(*message_content, sep='\n')))
-        for week in grid:
-            for i in week:
-                if i[1].date() == datetime.now().date():
-                    if 'white' in i[0] or 'black' in i[0]:
-                        i[0] = i[0].replace('circle', 'large_square')
-                    else:
-                        i[0] = i[0].replace('circle', 'square')
-        grid = [[i[0] for i in week] for week in grid]
-        await message.answer_document(file, caption=emojize(text(
-            text(f'Отчет о проделанной работе с {start_dt.date()} по {end_dt.date()}'),
-            text(''),
-            text('Пн Вт Ср Чт Пт Сб Вс'),
-            *[text(*week, sep='') for week in grid],
-            sep='\n'
-        )))
+report_periods = {
+    '/wsr': ReportPeriods.week,
+    '/msr': ReportPeriods.month,
+    '/qsr': ReportPeriods.quarter,
+    '/ysr': ReportPeriods.year,
+}
 
 
-@dp.message_handler(HashTag(hashtags=['сегодня', 'Сегодня', 'today', 'Today']))
-async def create_today_todo_list(message: types.Message, chat: Chat):
-    dt = message.date
-    async with OrmSession() as session:
-        parsed_todo_items = get_bulleted_items_list_from_message(message)
-        if parsed_todo_items:
-            select_stmt = select(Project) \
-                .where(
-                    Project.chat_id == chat.id
-                ) \
-                .order_by(Project.id)
-            projects_result = await session.execute(select_stmt)
-            project = projects_result.scalars().first()
-
-            bucket = PeriodBucket.new(project.period_bucket_mode, dt)
-            if bucket.is_valid():
-                new_todo_list = await project.create_new_for_period_with_items_or_append_to_existing(
-                    session, bucket, dt, parsed_todo_items
-                )
-                await session.commit()
-                if project.period_bucket_mode in [PeriodBucketModes.daily, PeriodBucketModes.onworkingdays]:
-                    reply_message_text = text(
-                        text('План составлен не с вечера, но и день в день - тоже замечательно. Вот, пожалуйста:')
-                        if new_todo_list else text('К вашим сегодняшним планам я добавлю:'),
-                        text(''),
-                        *[text(':inbox_tray:', parsed_item) for parsed_item in parsed_todo_items],
-                        text(''),
-                        text('Чтобы свериться со списком запланированных дел, можно набрать /todo'),
-                        sep='\n'
-                    )
-                else:
-                    if project.period_bucket_mode == PeriodBucketModes.weekly:
-                        period_bucket_word = 'на текущую неделю'
-                    elif project.period_bucket_mode == PeriodBucketModes.monthly:
-                        period_bucket_word = 'на текущий месяц'
-                    elif project.period_bucket_mode == PeriodBucketModes.yearly:
-                        period_bucket_word = 'на текущий год'
-                    else:
-                        period_bucket_word = ''
-                    reply_message_text = text(
-                        (
-                            text('Я запишу ваши планы на ', period_bucket_word, ':', sep='')
-                            if new_todo_list else
-                            text('К вашим планам', period_bucket_word, 'я добавлю:')
-                        ) if period_bucket_word else (
-                            text('Я запишу ваши планы')
-                            if new_todo_list else
-                            text('К вашим планам я добавлю:')
-                        )
-                        ,
-                        text(''),
-                        *[text(':inbox_tray:', parsed_item) for parsed_item in parsed_todo_items],
-                        text(''),
-                        text('Чтобы свериться со списком запланированных дел, можно набрать /todo'),
-                        sep='\n'
-                    )
-                await message.reply(
-                    emojize(reply_message_text),
-                    disable_web_page_preview=True,
-                )
-            else:
-                await message.reply(
-                    text('Сегодня выходной, никаких планов, пожалуйста. Ничего не буду добавлять'),
-                    disable_web_page_preview=True,
-                )
+async def iter_report_pages(session, project, from_period, to_period, stats):
+    if has_items(stats):
+        todo_lists_pages = project.iter_range(
+            session, from_period, to_period, REPORT_PAGE_SIZE, with_log_messages=True
+        )
+        async for todo_lists in todo_lists_pages:
+            yield get_report_entries(todo_lists)
+
+
+@dp.message_handler(commands=['wsr', 'msr', 'qsr', 'ysr'])
+async def status_report(message: types.Message, project: Project, session: AsyncSession):
+    now = project.to_local_time(message.date)
+    report_period = report_periods[message.get_command()]
+    start_dt, end_dt = get_report_period(report_period, now)
+    # the calendar marks today, so the report changes every day even without new items
+    cache_key = (project.id, report_period, start_dt.date(), now.date())
+    # the cached project is not reloaded on writes, so its data version is out of date
+    data_version = await Project.get_data_version(session, project.id)
+    cached_report = report_cache.get(cache_key, data_version)
+    with SpooledReportFile(REPORT_SPOOL_MAX_SIZE) as report:
+        if cached_report is None:
+            from_period = PeriodBucket.new(project.period_bucket_mode, start_dt)
+            to_period = PeriodBucket.new(project.period_bucket_mode, end_dt)
+            stats = [BucketStats(*row) for row in await project.get_range_stats(session, from_period, to_period)]
+            # every page is written to the report as soon as it is loaded, so only one page is kept in memory
+            caption, report_size = await write_status_report_pages(
+                start_dt, end_dt, now.date(), stats,
+                iter_report_pages(session, project, from_period, to_period, stats), report,
+                executor=report_executor, offload_threshold=REPORT_RENDER_OFFLOAD_THRESHOLD
+            )
+            if report_size <= REPORT_CACHE_MAX_DOCUMENT_SIZE:
+                report_cache.put(cache_key, data_version, caption, report.read())
+                report.seek(0)
+        else:
+            caption, document = cached_report
+            report_size = report.write(document)
+            report.seek(0)
+        # ends the read-only transaction, so the connection is not held while the report is sent
+        await session.commit()
+        if report_size:
+            await message.answer_document(types.InputFile(report, filename='report.txt'), caption=caption)
+        else:
+            await message.answer(caption, disable_web_page_preview=True)
 
 
-item_logging.apply_registration(dp)
-updateprojectsettings.apply_registration(dp)
-newproject.apply_registration(dp)
-item_status_changing.apply_registration(dp)
+@dp.message_handler(commands='stats')
+async def project_stats(message: types.Message, project: Project, session: AsyncSession):
+    stats = [BucketStats(*row) for row in await project.get_bucket_stats(session)]
+    await message.answer(render_project_stats(stats), disable_web_page_preview=True)
 
 
-@dp.message_handler()
-async def create_tomorrow_todo_list(message: types.Message, chat: Chat):
+@dp.message_handler(commands='export')
+async def export_history(message: types.Message, project: Project, session: AsyncSession):
+    export_format = get_export_format(message.get_args())
+    if export_format is None:
+        await message.answer('Выгрузить историю я могу только в форматах csv и jsonl, например /export jsonl')
+        return
+    with SpooledReportFile(REPORT_SPOOL_MAX_SIZE) as export:
+        if export_format == ExportFormats.csv:
+            await project.copy_history_to(session, export)
+        else:
+            await write_jsonl(project.stream_history(session), export)
+        await session.commit()
+        export.seek(0)
+        await message.answer_document(
+            types.InputFile(export, filename=f'history.{export_format.name}'),
+            caption=f'История проекта {project.name}'
+        )
+
+
+@dp.message_handler(HashTag(hashtags=['сегодня', 'Сегодня', 'today', 'Today']))
+async def create_today_todo_list(message: types.Message, project: Project, session: AsyncSession):
     dt = message.date
-    async with OrmSession() as session:
-        parsed_todo_items = get_bulleted_items_list_from_message(message)
-        if parsed_todo_items:
-            select_stmt = select(Project) \
-                .where(
-                    Project.chat_id == chat.id
-                ) \
-                .order_by(Project.id)
-            projects_result = await session.execute(select_stmt)
-            project = projects_result.scalars().first()
-
-            bucket = PeriodBucket.new(project.period_bucket_mode, dt).get_next()
+    parsed_todo_items = get_bulleted_items_list_from_message(message)
+    if parsed_todo_items:
+        bucket = PeriodBucket.new(project.period_bucket_mode, project.to_local_time(dt))
+        if bucket.is_valid():
             new_todo_list = await project.create_new_for_period_with_items_or_append_to_existing(
                 session, bucket, dt, parsed_todo_items
             )
             await session.commit()
             if project.period_bucket_mode in [PeriodBucketModes.daily, PeriodBucketModes.onworkingdays]:
                 reply_message_text = text(
-                    text('Я запишу, что вы запланировали:')
-                    if new_todo_list else text('К тому, что вы уже запланировали я добавлю:'),
+                    text('План составлен не с вечера, но и день в день - тоже замечательно. Вот, пожалуйста:')
+                    if new_todo_list else text('К вашим сегодняшним планам я добавлю:'),
                     text(''),
-                    *[text(':inbox_tray: ', parsed_item) for parsed_item in parsed_todo_items],
+                    *[text(':inbox_tray:', parsed_item) for parsed_item in parsed_todo_items],
                     text(''),
-                    text('Завтра я напомню об этом. Чтобы посмотреть планы в любой момент, можно набрать /planned'),
+                    text('Чтобы свериться со списком запланированных дел, можно набрать /todo'),
                     sep='\n'
                 )
             else:
                 if project.period_bucket_mode == PeriodBucketModes.weekly:
-                    period_bucket_word = 'на следующую неделю'
+                    period_bucket_word = 'на текущую неделю'
                 elif project.period_bucket_mode == PeriodBucketModes.monthly:
-                    period_bucket_word = 'на следующий месяц'
+                    period_bucket_word = 'на текущий месяц'
                 elif project.period_bucket_mode == PeriodBucketModes.yearly:
-                    period_bucket_word = 'на следующий год'
+                    period_bucket_word = 'на текущий год'
                 else:
                     period_bucket_word = ''
                 reply_message_text = text(
@@ -359,27 +283,96 @@ async def create_tomorrow_todo_list(message: types.Message, chat: Chat):
                         text('Я запишу ваши планы')
                         if new_todo_list else
                         text('К вашим планам я добавлю:')
-                    ),
+                    )
+                    ,
                     text(''),
-                    *[text(':inbox_tray: ', parsed_item) for parsed_item in parsed_todo_items],
+                    *[text(':inbox_tray:', parsed_item) for parsed_item in parsed_todo_items],
                     text(''),
-                    text('Завтра я напомню об этом. Чтобы посмотреть планы в любой момент, можно набрать /planned'),
-                    # TODO это уже связано с настройками проекта, надо вычислять дату и тип уведомления и писать тут
+                    text('Чтобы свериться со списком запланированных дел, можно набрать /todo'),
                     sep='\n'
                 )
             await message.reply(
                 emojize(reply_message_text),
                 disable_web_page_preview=True,
             )
+        else:
+            await message.reply(
+                text('Сегодня выходной, никаких планов, пожалуйста. Ничего не буду добавлять'),
+                disable_web_page_preview=True,
+            )
+
+
+item_logging.apply_registration(dp)
+updateprojectsettings.apply_registration(dp)
+newproject.apply_registration(dp)
+item_status_changing.apply_registration(dp)
+history_import.apply_registration(dp)
+
+
+@dp.message_handler()
+async def create_tomorrow_todo_list(message: types.Message, project: Project, session: AsyncSession):
+    dt = message.date
+    parsed_todo_items = get_bulleted_items_list_from_message(message)
+    if parsed_todo_items:
+        bucket = PeriodBucket.new(project.period_bucket_mode, project.to_local_time(dt)).get_next()
+        new_todo_list = await project.create_new_for_period_with_items_or_append_to_existing(
+            session, bucket, dt, parsed_todo_items
+        )
+        await session.commit()
+        if project.period_bucket_mode in [PeriodBucketModes.daily, PeriodBucketModes.onworkingdays]:
+            reply_message_text = text(
+                text('Я запишу, что вы запланировали:')
+                if new_todo_list else text('К тому, что вы уже запланировали я добавлю:'),
+                text(''),
+                *[text(':inbox_tray: ', parsed_item) for parsed_item in parsed_todo_items],
+                text(''),
+                text('Завтра я напомню об этом. Чтобы посмотреть планы в любой момент, можно набрать /planned'),
+                sep='\n'
+            )
+        else:
+            if project.period_bucket_mode == PeriodBucketModes.weekly:
+                period_bucket_word = 'на следующую неделю'
+            elif project.period_bucket_mode == PeriodBucketModes.monthly:
+                period_bucket_word = 'на следующий месяц'
+            elif project.period_bucket_mode == PeriodBucketModes.yearly:
+                period_bucket_word = 'на следующий год'
+            else:
+                period_bucket_word = ''
+            reply_message_text = text(
+                (
+                    text('Я запишу ваши планы на ', period_bucket_word, ':', sep='')
+                    if new_todo_list else
+                    text('К вашим планам', period_bucket_word, 'я добавлю:')
+                ) if period_bucket_word else (
+                    text('Я запишу ваши планы')
+                    if new_todo_list else
+                    text('К вашим планам я добавлю:')
+                ),
+                text(''),
+                *[text(':inbox_tray: ', parsed_item) for parsed_item in parsed_todo_items],
+                text(''),
+                text('Завтра я напомню об этом. Чтобы посмотреть планы в любой момент, можно набрать /planned'),
+                # TODO это уже связано с настройками проекта, надо вычислять дату и тип уведомления и писать тут
+                sep='\n'
+            )
+        await message.reply(
+            emojize(reply_message_text),
+            disable_web_page_preview=True,
+        )
 
 
 async def on_startup(_):
-    asyncio.create_task(notification_processing_loop())
+    asyncio.create_task(run_forever(notification_processing_loop))
+    asyncio.create_task(run_forever(outbox_sending_loop))
+    asyncio.create_task(run_forever(cache_stats_logging_loop))
+    asyncio.create_task(run_forever(bucket_stats_recount_loop))
 
 
 if __name__ == '__main__':
     dp.middleware.setup(LoggingMiddleware(log))
     dp.middleware.setup(WhitelistMiddleware(WHITELISTED_USERS, WHITELISTED_CHATS))
+    dp.middleware.setup(UpdateSessionMiddleware())
     dp.middleware.setup(GetOrCreateChatMiddleware())
     dp.middleware.setup(GetOrCreateUserMiddleware())
+    dp.middleware.setup(GetProjectMiddleware())
     executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
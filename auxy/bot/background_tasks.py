@@ -1,83 +1,303 @@
 import logging
-from datetime import datetime
+import functools
+from collections import defaultdict
+from datetime import datetime, timedelta
 import asyncio
-import io
-from aiogram import types
 from aiogram.utils.emoji import emojize
 from aiogram.utils.markdown import text
-from sqlalchemy.orm import selectinload
 from sqlalchemy.future import select
-from dateutil.relativedelta import relativedelta, WE
+from sqlalchemy import delete, update, exists, or_, func, tuple_
 import pytz
+from auxy.settings import NOTIFICATION_SCHEDULE_HORIZON, NOTIFICATION_MISFIRE_POLICY, \
+    NOTIFICATION_MISFIRE_GRACE, NOTIFICATION_LEASE_TIMEOUT, NOTIFICATION_CLAIM_BATCH, REPLICA_ID, \
+    REPORT_RENDER_OFFLOAD_THRESHOLD, CACHE_STATS_LOG_INTERVAL, BUCKET_STATS_RECOUNT_INTERVAL
 from auxy.db import OrmSession
-from auxy.db.models import Project, ItemsList, Item
-from . import bot
-from auxy.utils import generate_grid
+from auxy.db.models import Project, NotificationSchedule, BucketStats
+from . import outbox, report_executor, user_cache, chat_cache, project_cache
 from auxy.utils import PeriodBucket
+from auxy.reports import ReportPeriods, get_report_period, get_report_entries, get_report_stats, \
+    render_status_report_async
+from auxy.scheduler import NotificationScheduler, MisfirePolicy, resolve_misfire
+from auxy.notification_rules import get_notification_rule
+from auxy.timezones import to_local_times, group_by_wall_time
 
 
-notification_time_cache = dict()
+scheduler = NotificationScheduler(timedelta(seconds=NOTIFICATION_SCHEDULE_HORIZON))
+misfire_policy = MisfirePolicy[NOTIFICATION_MISFIRE_POLICY]
+misfire_grace = timedelta(seconds=NOTIFICATION_MISFIRE_GRACE)
+lease_timeout = timedelta(seconds=NOTIFICATION_LEASE_TIMEOUT)
+SCHEDULE_NEW_PROJECTS_LOCK_ID = 1
+# the event loop keeps only weak references to tasks, running dispatches must not be collected
+dispatch_tasks = set()
+
+
+async def run_forever(loop, restart_delay=5):
+    """
+    Restarts the background loop if it fails, so a single error does not stop it for good
+    """
+    while True:
+        try:
+            await loop()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception('Background loop %s has failed, restarting', loop.__name__)
+            await asyncio.sleep(restart_delay)
+
+
+async def reschedule_project(session, project):
+    """
+    Replaces stored notification times of the project according to its current settings.
+    The caller is responsible for the commit.
+    """
+    now = datetime.now(pytz.utc)
+    await session.execute(delete(NotificationSchedule).where(NotificationSchedule.project_id == project.id))
+    scheduler.unschedule(project.id)
+    schedule_project(session, project, now)
+
+
+def schedule_project(session, project, now):
+    for action_name, config in project.settings.items():
+        if action_name in actions:
+            next_notification_time = get_next_notification_time(project, action_name, now)
+            if next_notification_time is None:
+                logging.warning('Notification "%s" for project#%s will never fire', action_name, project.id)
+                continue
+            session.add(NotificationSchedule(
+                project_id=project.id,
+                action=action_name,
+                next_fire_at=next_notification_time
+            ))
+            scheduler.schedule(project.id, action_name, next_notification_time)
+            logging.info(
+                'Notification "%s" for project#%s have been scheduled to %s',
+                action_name, project.id, next_notification_time
+            )
+
+
+async def schedule_new_projects(now):
+    async with OrmSession() as session:
+        # replicas starting at the same time must not schedule the same projects twice
+        await session.execute(select(func.pg_advisory_xact_lock(SCHEDULE_NEW_PROJECTS_LOCK_ID)))
+        select_stmt = select(Project) \
+            .where(~exists().where(NotificationSchedule.project_id == Project.id))
+        projects_result = await session.execute(select_stmt)
+        for project in projects_result.scalars():
+            schedule_project(session, project, now)
+        await session.commit()
+
+
+async def load_schedule_window(now):
+    window_end = scheduler.move_window(now)
+    async with OrmSession() as session:
+        select_stmt = select(NotificationSchedule) \
+            .where(NotificationSchedule.next_fire_at <= window_end)
+        schedule_result = await session.execute(select_stmt)
+        for row in schedule_result.scalars():
+            scheduler.schedule(row.project_id, row.action, row.next_fire_at)
 
 
 async def notification_processing_loop():
-    nsktz = pytz.timezone('Asia/Novosibirsk')
+    await schedule_new_projects(datetime.now(pytz.utc))
+    while True:
+        now = datetime.now(pytz.utc)
+        if scheduler.is_window_expired(now):
+            await load_schedule_window(now)
+        due = scheduler.pop_due(now)
+        if due:
+            claimed, has_more = await claim_due_notifications(now)
+            claimed_keys = set()
+            claimed_by_action = defaultdict(list)
+            for project, action_name, fire_now, scheduled_at, next_notification_time in claimed:
+                claimed_keys.add((project.id, action_name))
+                claimed_by_action[action_name].append((project, fire_now, scheduled_at, next_notification_time))
+            for action_name, action_claimed in claimed_by_action.items():
+                task = asyncio.ensure_future(dispatch_due_notifications(action_name, action_claimed))
+                dispatch_tasks.add(task)
+                task.add_done_callback(dispatch_tasks.discard)
+            unclaimed_keys = [
+                (project_id, action_name) for _, project_id, action_name in due
+                if (project_id, action_name) not in claimed_keys
+            ]
+            if unclaimed_keys:
+                await reschedule_unclaimed(unclaimed_keys, now, has_more)
+        else:
+            await scheduler.wait(now)
+
+
+async def cache_stats_logging_loop():
     while True:
+        await asyncio.sleep(CACHE_STATS_LOG_INTERVAL)
+        for name, cache in (('user', user_cache), ('chat', chat_cache), ('project', project_cache)):
+            logging.info('Cache of %ss: %s', name, cache.get_stats())
+
+
+async def bucket_stats_recount_loop():
+    while True:
+        await asyncio.sleep(BUCKET_STATS_RECOUNT_INTERVAL)
         async with OrmSession() as session:
-            select_stmt = select(Project)
-            projects_result = await session.execute(select_stmt)
-            for project in projects_result.scalars():
-                await process_project_settings_and_send_messages(session, project, datetime.now(nsktz))
-        await asyncio.sleep(10)
+            await BucketStats.recount_all(session)
+        logging.info('Bucket stats have been recounted')
 
 
-async def process_project_settings_and_send_messages(session, project, now):
-    for func, config in project.settings.items():
-        action = actions.get(func)
-        if action:
-            notification_settings = config['notification_settings']
-            await schedule_notification(session, action, project, notification_settings, now)
-            await asyncio.sleep(.05)
+async def reschedule_unclaimed(keys, now, has_more):
+    """
+    Schedules notifications which have been due but not claimed according to their stored rows,
+    another replica could have leased, moved or deleted them meanwhile.
+    Entries of deleted rows are dropped, the ones moved out of the window are loaded with it.
+    """
+    async with OrmSession() as session:
+        select_stmt = select(NotificationSchedule) \
+            .where(tuple_(NotificationSchedule.project_id, NotificationSchedule.action).in_(keys))
+        rows = (await session.execute(select_stmt)).scalars().all()
+    for row in rows:
+        if row.next_fire_at > now:
+            retry_at = row.next_fire_at
+        elif row.locked_until is not None and row.locked_until >= now:
+            # the lease could expire without the notification being sent, then it is taken over
+            retry_at = row.locked_until
+        else:
+            # it did not fit into the batch or is being claimed by another replica right now
+            retry_at = now if has_more else now + lease_timeout
+        scheduler.schedule(row.project_id, row.action, retry_at)
 
 
-async def schedule_notification(session, action, project, notification_settings, now):
-    global notification_time_cache
-    cache_key = f'{project.id}-{action.__name__}'
+async def claim_due_notifications(now):
+    """
+    Leases due notifications to this replica and returns the ones to be sent
+    according to the misfire policy along with their scheduled and next fire times.
 
-    if cache_key not in notification_time_cache:
-        notification_time_cache[cache_key] = get_next_notification_time(now, notification_settings)
-        logging.info(
-            'Notification "%s" for project#%s have been scheduled to %s',
-            action.__name__, project.id,
-            notification_time_cache[cache_key]
-        )
+    Rows locked by other replicas are skipped, rows with expired leases are taken over.
+    """
+    claimed = []
+    async with OrmSession() as session:
+        select_stmt = select(NotificationSchedule) \
+            .where(
+                NotificationSchedule.next_fire_at <= now,
+                or_(NotificationSchedule.locked_until.is_(None), NotificationSchedule.locked_until < now),
+            ) \
+            .order_by(NotificationSchedule.next_fire_at) \
+            .limit(NOTIFICATION_CLAIM_BATCH) \
+            .with_for_update(skip_locked=True)
+        rows = (await session.execute(select_stmt)).scalars().all()
+        if not rows:
+            return claimed, False
+        select_stmt = select(Project).where(Project.id.in_({row.project_id for row in rows}))
+        projects_result = await session.execute(select_stmt)
+        projects = {project.id: project for project in projects_result.scalars()}
+        for row in rows:
+            project = projects.get(row.project_id)
+            config = project.settings.get(row.action) if project else None
+            if not config or row.action not in actions:
+                logging.info('Notification "%s" for project#%s is not configured anymore', row.action, row.project_id)
+                await session.delete(row)
+                continue
+            fire_now, base_dt = resolve_misfire(misfire_policy, row.next_fire_at, now, misfire_grace)
+            next_notification_time = get_next_notification_time(project, row.action, base_dt)
+            if fire_now is None:
+                logging.info(
+                    'Notification "%s" for project#%s at %s has been skipped',
+                    row.action, row.project_id, row.next_fire_at
+                )
+                if next_notification_time is None:
+                    await session.delete(row)
+                else:
+                    row.next_fire_at = next_notification_time
+                    scheduler.schedule(row.project_id, row.action, next_notification_time)
+                continue
+            row.locked_by = REPLICA_ID
+            row.locked_until = now + lease_timeout
+            claimed.append((project, row.action, fire_now, row.next_fire_at, next_notification_time))
+        await session.commit()
+    return claimed, len(rows) == NOTIFICATION_CLAIM_BATCH
 
-    next_notification_time = notification_time_cache.get(cache_key)
-    if now >= next_notification_time:
-        await action(session, project, now)
-        notification_time_cache.pop(cache_key)
+
+async def release_notification(session, project, action_name, next_notification_time):
+    if next_notification_time is None:
+        stmt = delete(NotificationSchedule)
+    else:
+        stmt = update(NotificationSchedule) \
+            .values(next_fire_at=next_notification_time, locked_by=None, locked_until=None)
+    stmt = stmt.where(
+        NotificationSchedule.project_id == project.id,
+        NotificationSchedule.action == action_name,
+        NotificationSchedule.locked_by == REPLICA_ID,
+    )
+    result = await session.execute(stmt)
+    if not result.rowcount:
+        logging.warning('Lease of notification "%s" for project#%s has been lost', action_name, project.id)
+        return False
+    return True
+
+
+async def dispatch_due_notifications(action_name, claimed):
+    """
+    Renders notifications and puts them to the outbox in the same transaction that loads
+    their data and moves the schedule forward, the outbox sender delivers them afterwards
+    """
+    load, render = actions[action_name]
+    released = []
+    try:
+        async with OrmSession() as session:
+            due = to_local_times([(project, fire_now) for project, fire_now, _, _ in claimed])
+            prefetched = await load(session, due)
+            for (project, fire_now, scheduled_at, next_notification_time), (_, now) in zip(claimed, due):
+                try:
+                    messages = await render(project, now, prefetched)
+                except Exception:
+                    logging.exception('Notification "%s" for project#%s has failed', action_name, project.id)
+                    messages = []
+                # the replica which has taken over the lease sends the notification instead,
+                # the released row stays locked until the commit, so it can not be taken over meanwhile
+                if not await release_notification(session, project, action_name, next_notification_time):
+                    continue
+                released.append((project, next_notification_time))
+                # every replica sending the same scheduled notification builds the same key
+                dedup_key = f'{action_name}-{project.id}-{scheduled_at.astimezone(pytz.utc).isoformat()}'
+                for i, (method, payload) in enumerate(messages):
+                    await outbox.enqueue(session, project.chat_id, method, payload, dedup_key=f'{dedup_key}-{i}')
+            await session.commit()
+    except Exception:
+        logging.exception('Notifications "%s" have failed, they will be retried after the lease timeout', action_name)
+        return
+    outbox.notify_senders()
+    for project, next_notification_time in released:
+        if next_notification_time is not None:
+            scheduler.schedule(project.id, action_name, next_notification_time)
 
 
-def get_next_notification_time(now, timings):
-    possible_times = [now + relativedelta(**timing) for timing in timings]
-    possible_times = list(filter(lambda possible_time: possible_time > now, possible_times))
-    if len(possible_times) == 1:
-        return possible_times[0]
-    return min(*possible_times)
+def get_next_notification_time(project, action_name, now):
+    notification_settings = project.settings[action_name]['notification_settings']
+    rule = get_notification_rule(project.id, action_name, notification_settings)
+    return rule.get_next(project.to_local_time(now))
 
 
-async def todo_for_today(session, project, now):
+def get_period_buckets(due, get_bucket_dt):
+    """
+    Builds period buckets of projects due at their local times, every bucket is built
+    once per wall clock time and bucket mode
+    """
+    period_buckets = {}
+    for wall_dt, projects in group_by_wall_time(due).items():
+        bucket_dt = get_bucket_dt(wall_dt)
+        buckets = {}
+        for project in projects:
+            bucket = buckets.get(project.period_bucket_mode)
+            if bucket is None:
+                bucket = buckets[project.period_bucket_mode] = PeriodBucket.new(project.period_bucket_mode, bucket_dt)
+            period_buckets[project.id] = bucket
+    return period_buckets
+
+
+async def load_current_items_lists(session, due, with_log_messages=False):
+    period_buckets = get_period_buckets(due, lambda now: now.date())
+    return await Project.get_for_periods(session, period_buckets, with_log_messages=with_log_messages)
+
+
+async def todo_for_today(project, now, items_lists):
     config = project.settings['todo_for_today']
     logging.info('Calling at %s todo_for_today for project%s %s', now, project.id, config)
-    bucket = PeriodBucket.new(project.period_bucket_mode, now.date())
-    select_stmt = select(ItemsList) \
-        .options(selectinload(ItemsList.items)) \
-        .where(
-        ItemsList.project_id == project.id,
-        ItemsList.period_bucket_key == bucket.key(),
-        ) \
-        .order_by(ItemsList.created_dt.desc())
-    todo_lists_result = await session.execute(select_stmt)
-    todo_list = todo_lists_result.scalars().first()
+    todo_list = items_lists.get(project.id)
     if todo_list:
         message_content = [
                               text('Вот, что вы на сегодня планировали:'),
@@ -88,33 +308,19 @@ async def todo_for_today(session, project, now):
                               text(''),
                               text('Все точно получится!'),
                           ]
-        await bot.send_message(
-            project.chat_id,
+        return [outbox.message(
             emojize(text(*message_content, sep='\n')),
             disable_web_page_preview=True,
-        )
-    else:
-        await bot.send_message(
-            project.chat_id,
-            text('У вас с вечера не составлены планы.', 'Предлагаю составить их прямо сейчас.'),
-        )
+        )]
+    return [outbox.message(
+        text('У вас с вечера не составлены планы.', 'Предлагаю составить их прямо сейчас.'),
+    )]
 
 
-async def end_of_work_day(session, project, now):
+async def end_of_work_day(project, now, items_lists):
     config = project.settings['end_of_work_day']
     logging.info('Calling at %s end_of_work_day for project%s %s', now, project.id, config)
-    bucket = PeriodBucket.new(project.period_bucket_mode, now.date())
-    select_stmt = select(ItemsList) \
-        .options(
-            selectinload(ItemsList.items).selectinload(Item.notes)
-        ) \
-        .where(
-        ItemsList.project_id == project.id,
-        ItemsList.period_bucket_key == bucket.key(),
-        ) \
-        .order_by(ItemsList.created_dt.desc())
-    todo_lists_result = await session.execute(select_stmt)
-    todo_list = todo_lists_result.scalars().first()
+    todo_list = items_lists.get(project.id)
     if todo_list:
         today_report = [text('Напомню, что было сегодня:')]
         for item in todo_list.items:
@@ -133,83 +339,39 @@ async def end_of_work_day(session, project, now):
         text(''),
         *list(map(text, reminder_text_lines[1:])),
     ]
-    await bot.send_message(
-        project.chat_id,
+    return [outbox.message(
         emojize(text(*message_content, sep='\n')),
         disable_web_page_preview=True,
-    )
+    )]
+
+
+async def load_weekly_items_lists(session, due):
+    start_buckets = get_period_buckets(due, lambda now: get_report_period(ReportPeriods.week, now)[0].date())
+    end_buckets = get_period_buckets(due, lambda now: get_report_period(ReportPeriods.week, now)[1].date())
+    bucket_ranges = {
+        project_id: (start_bucket, end_buckets[project_id]) for project_id, start_bucket in start_buckets.items()
+    }
+    return await Project.get_range_for_projects(session, bucket_ranges, with_log_messages=True)
 
 
-async def weekly_status_report(session, project, now):
+async def weekly_status_report(project, now, items_lists):
     config = project.settings['weekly_status_report']
     logging.info('Calling at %s weekly_status_report for project%s %s', now, project.id, config)
-    start_dt = now + relativedelta(weekday=WE(-1), hour=0, minute=0, second=0, microsecond=0)
-    end_dt = now + relativedelta(weekday=WE, hour=0, minute=0, second=0, microsecond=0) - relativedelta(days=1)
-    grid = generate_grid(start_dt, end_dt)
-    grid = [[[i[0], i[1]] for i in week] for week in grid]
-    bucket = PeriodBucket.new(project.period_bucket_mode, start_dt.date())
-    select_stmt = select(ItemsList) \
-        .options(
-            selectinload(ItemsList.items)
-            .selectinload(Item.notes)
-        ) \
-        .where(
-        ItemsList.project_id == project.id,
-        ItemsList.period_bucket_key >= bucket.key(),
-        ) \
-        .order_by(ItemsList.period_bucket_key)
-    project_daily_todo_lists = await session.execute(select_stmt)
-
-    message_content = []
-    for todo_list in project_daily_todo_lists.scalars():
-        bucket = PeriodBucket.get_by_key(todo_list.period_bucket_key)
-        for todo_item in todo_list.items:
-            message_content.append(text(
-                ':spiral_calendar_pad:', str(bucket),
-                ':pushpin:', todo_item.text
-            ))
-            for log_message in todo_item.notes:
-                message_content.append(text(':paperclip:', log_message.text))
-            message_content.append(text(''))
-
-        if bucket.start():
-            for week in grid:
-                for i in week:
-                    if i[1].date() == bucket.start().date():
-                        i[0] = i[0].replace('white', 'purple')
-
-    for week in grid:
-        for i in week:
-            if i[1].date() == datetime.now().date():
-                if 'white' in i[0] or 'black' in i[0]:
-                    i[0] = i[0].replace('circle', 'large_square')
-                else:
-                    i[0] = i[0].replace('circle', 'square')
-    grid = [[i[0] for i in week] for week in grid]
-    if message_content:
-        file = io.StringIO(emojize(text(*message_content, sep='\n')))
-        await bot.send_document(project.chat_id, file, caption=emojize(text(
-            text(f'Отчет о проделанной работе с {start_dt.date()} по {end_dt.date()}'),
-            text(''),
-            text('Пн Вт Ср Чт Пт Сб Вс'),
-            *[text(*week, sep='') for week in grid],
-            sep='\n'
-        )))
-    else:
-        await bot.send_message(
-            project.chat_id,
-            emojize(text(
-                text(f'В период с {start_dt.date()} по {end_dt.date()} получается пустой отчет о проделанной работе'),
-                text(''),
-                text('Пн Вт Ср Чт Пт Сб Вс'),
-                *[text(*week, sep='') for week in grid],
-                sep='\n'
-            )),
-            disable_web_page_preview=True,
-        )
+    start_dt, end_dt = get_report_period(ReportPeriods.week, now)
+    stats = get_report_stats(items_lists[project.id])
+    entries = get_report_entries(items_lists[project.id])
+    caption, report = await render_status_report_async(
+        start_dt, end_dt, now.date(), stats, entries,
+        executor=report_executor, offload_threshold=REPORT_RENDER_OFFLOAD_THRESHOLD
+    )
+    if report:
+        return [outbox.document(report, 'report.txt', caption=caption)]
+    return [outbox.message(caption, disable_web_page_preview=True)]
+
 
+# every action is sent with data prefetched at once for all projects due at the same time
 actions = {
-    'todo_for_today': todo_for_today,
-    'end_of_work_day': end_of_work_day,
-    'weekly_status_report': weekly_status_report,
+    'todo_for_today': (load_current_items_lists, todo_for_today),
+    'end_of_work_day': (functools.partial(load_current_items_lists, with_log_messages=True), end_of_work_day),
+    'weekly_status_report': (load_weekly_items_lists, weekly_status_report),
 }
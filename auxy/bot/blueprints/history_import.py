@@ -0,0 +1,76 @@
+import logging
+from aiogram import types
+from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.dispatcher import FSMContext
+from aiogram.utils.exceptions import TelegramAPIError
+from asyncpg import PostgresError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from auxy.settings import REPORT_SPOOL_MAX_SIZE, IMPORT_PROGRESS_ROWS
+from auxy.db.models import Project
+from auxy.imports import HistoryFormatError, iter_history_rows
+from auxy.reports import SpooledReportFile
+from modular_aiogram_handlers import Blueprint
+
+
+class ImportHistoryForm(StatesGroup):
+    history_file = State()
+
+
+history_import = Blueprint()
+
+
+async def report_progress(rows, progress_message: types.Message):
+    rows_num = 0
+    for row in rows:
+        yield row
+        rows_num += 1
+        if rows_num % IMPORT_PROGRESS_ROWS == 0:
+            try:
+                await progress_message.edit_text(f'Загружено строк: {rows_num}')
+            except TelegramAPIError:
+                logging.exception('Import progress has not been reported')
+
+
+@history_import.message_handler(commands='import')
+async def start_history_import(message: types.Message):
+    await ImportHistoryForm.history_file.set()
+    await message.reply(
+        'Пришлите, пожалуйста, csv- или jsonl-файл в том же формате, в котором его выгружает /export',
+        reply_markup=types.ForceReply(selective=True)
+    )
+
+
+@history_import.message_handler(content_types=types.ContentType.DOCUMENT, state=ImportHistoryForm.history_file)
+async def receive_history_file(message: types.Message, project: Project, session: AsyncSession, state: FSMContext):
+    if project is None:
+        await message.reply('В этом чате нет проекта, создайте его командой /newproject')
+        await state.finish()
+        return
+    jsonl = (message.document.file_name or '').lower().endswith(('.jsonl', '.json'))
+    progress_message = await message.reply('Загружено строк: 0')
+    with SpooledReportFile(REPORT_SPOOL_MAX_SIZE) as history_file:
+        await message.document.download(destination=history_file)
+        history_file.seek(0)
+        rows = report_progress(iter_history_rows(history_file, jsonl=jsonl), progress_message)
+        try:
+            rows_num = await project.import_history(session, rows)
+            await session.commit()
+        except HistoryFormatError as e:
+            await session.rollback()
+            await progress_message.edit_text('Загружено строк: 0')
+            await message.reply(
+                f'Ничего не загружено, {e}. Исправьте, пожалуйста, файл и пришлите его снова',
+                reply_markup=types.ForceReply(selective=True)
+            )
+            return
+        except (SQLAlchemyError, PostgresError):
+            logging.exception('History import to project#%s has failed', project.id)
+            await session.rollback()
+            await progress_message.edit_text('Загружено строк: 0')
+            await message.reply('Ничего не загружено, не удалось сохранить историю. Попробуйте, пожалуйста, позже')
+            await state.finish()
+            return
+    await progress_message.edit_text(f'Загружено строк: {rows_num}')
+    await message.reply(f'История проекта {project.name} загружена')
+    await state.finish()
@@ -1,14 +1,16 @@
 import json
 import io
 from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram import types
 from aiogram.utils.markdown import text, code
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.dispatcher import FSMContext
-from auxy.db import OrmSession
 from auxy.db.models import User, Chat, Project
-from auxy.bot import bot
+from auxy.bot import bot, project_cache
+from auxy.bot.background_tasks import reschedule_project
 from auxy.utils import PeriodBucketModes
+from auxy.timezones import DEFAULT_TIMEZONE, is_valid_timezone
 from modular_aiogram_handlers import Blueprint
 
 
@@ -40,32 +42,31 @@ async def start_new_project_creation(message: types.Message):
 
 
 @newproject.message_handler(lambda message: len(message.text) <= 150, state=NewProjectForm.project_name)
-async def process_project_name(message: types.Message, user: User, state: FSMContext):
-    async with OrmSession() as session:
-        select_stmt = select(Project) \
-            .where(
-            Project.name == message.text,
-            Project.owner_user_id == user.id,
+async def process_project_name(message: types.Message, user: User, session: AsyncSession, state: FSMContext):
+    select_stmt = select(Project) \
+        .where(
+        Project.name == message.text,
+        Project.owner_user_id == user.id,
+    )
+    projects_result = await session.execute(select_stmt)
+    project = projects_result.scalars().first()
+    if not project:
+        await state.update_data(project_name=message.text)
+        await NewProjectForm.next()
+
+        keyboard = [
+            [types.KeyboardButton(mode_name)]
+            for mode_name in human_period_bucket_modes.keys()
+        ]
+        await message.reply(
+            f'Выберите, когда обновлять списки задач',
+            reply_markup=types.ReplyKeyboardMarkup(keyboard=keyboard, selective=True)
+        )
+    else:
+        await message.reply(
+            f'Проект "{message.text}" уже существует, выберите другое имя',
+            reply_markup=types.ForceReply(selective=True)
         )
-        projects_result = await session.execute(select_stmt)
-        project = projects_result.scalars().first()
-        if not project:
-            await state.update_data(project_name=message.text)
-            await NewProjectForm.next()
-
-            keyboard = [
-                [types.KeyboardButton(mode_name)]
-                for mode_name in human_period_bucket_modes.keys()
-            ]
-            await message.reply(
-                f'Выберите, когда обновлять списки задач',
-                reply_markup=types.ReplyKeyboardMarkup(keyboard=keyboard, selective=True)
-            )
-        else:
-            await message.reply(
-                f'Проект "{message.text}" уже существует, выберите другое имя',
-                reply_markup=types.ForceReply(selective=True)
-            )
 
 
 @newproject.message_handler(lambda message: len(message.text) > 150, state=NewProjectForm.project_name)
@@ -97,35 +98,45 @@ async def process_project_period_bucket_mode_invalid(message: types.Message):
 
 
 @newproject.message_handler(content_types=types.ContentType.DOCUMENT, state=NewProjectForm.project_settigns_file)
-async def process_project_settigns_file(message: types.Message, user: User, chat: Chat, state: FSMContext):
+async def process_project_settigns_file(message: types.Message, user: User, chat: Chat, session: AsyncSession,
+                                        state: FSMContext):
     dt = message.date
     file = await bot.get_file(message.document['file_id'])
     settings = io.BytesIO()
     await file.download(settings)
     try:
         s = json.load(settings)
-        async with OrmSession() as session:
-            async with state.proxy() as data:
-                project = Project(
-                    owner_user_id=user.id,
-                    name=data['project_name'],
-                    chat_id=chat.id,
-                    period_bucket_mode=human_period_bucket_modes[data['human_period_bucket_mode']],
-                    created_dt=dt,
-                    settings=s
-                )
-                session.add(project)
-                await session.commit()
-                await message.reply(
-                    text(
-                        text('Проект', project.name, 'создан'),
-                        text('Примененные настройки:'),
-                        code(json.dumps(s, indent=4, sort_keys=True)),
-                        sep='\n'
-                    ),
-                    parse_mode=types.ParseMode.MARKDOWN
-                )
-                await state.finish()
+        if 'timezone' in s and not is_valid_timezone(s['timezone']):
+            await message.reply(
+                f'Неизвестный часовой пояс "{s["timezone"]}", пришлите другой файл',
+                reply_markup=types.ForceReply(selective=True)
+            )
+            return
+        async with state.proxy() as data:
+            project = Project(
+                owner_user_id=user.id,
+                name=data['project_name'],
+                chat_id=chat.id,
+                period_bucket_mode=human_period_bucket_modes[data['human_period_bucket_mode']],
+                created_dt=dt,
+                settings=s,
+                timezone=s.get('timezone', DEFAULT_TIMEZONE)
+            )
+            session.add(project)
+            await session.flush()
+            await reschedule_project(session, project)
+            await session.commit()
+            project_cache.invalidate(chat.id)
+            await message.reply(
+                text(
+                    text('Проект', project.name, 'создан'),
+                    text('Примененные настройки:'),
+                    code(json.dumps(s, indent=4, sort_keys=True)),
+                    sep='\n'
+                ),
+                parse_mode=types.ParseMode.MARKDOWN
+            )
+            await state.finish()
     except json.decoder.JSONDecodeError:
         await message.reply(
             'Это совсем не похоже на json-файл, пришлите другой файл',
@@ -1,13 +1,15 @@
 import json
 import io
 from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram import types
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.dispatcher import FSMContext
 from aiogram.utils.markdown import text, code
-from auxy.db import OrmSession
 from auxy.db.models import User, Project
-from auxy.bot import bot
+from auxy.bot import bot, project_cache
+from auxy.bot.background_tasks import reschedule_project
+from auxy.timezones import is_valid_timezone
 from modular_aiogram_handlers import Blueprint
 
 
@@ -20,64 +22,70 @@ updateprojectsettings = Blueprint()
 
 
 @updateprojectsettings.message_handler(commands='updateprojectsettings')
-async def start_project_settings_updating(message: types.Message, user: User):
-    async with OrmSession() as session:
-        select_stmt = select(Project) \
-            .where(
-                Project.owner_user_id == user.id,
-            )
-        projects_result = await session.execute(select_stmt)
-        keyboard = []
-        for project in projects_result.scalars():
-            if not keyboard or len(keyboard[-1]) < 2:
-                keyboard.append([])
-            keyboard[-1].append(types.KeyboardButton(project.name))
-        if keyboard:
-            await UpdateProjectSettingsForm.project_name.set()
-            await message.reply(
-                'Выберите проект',
-                reply_markup=types.ReplyKeyboardMarkup(keyboard=keyboard, selective=True)
-            )
-        else:
-            await message.reply('У вас нет проектов')
+async def start_project_settings_updating(message: types.Message, user: User, session: AsyncSession):
+    select_stmt = select(Project) \
+        .where(
+            Project.owner_user_id == user.id,
+        )
+    projects_result = await session.execute(select_stmt)
+    keyboard = []
+    for project in projects_result.scalars():
+        if not keyboard or len(keyboard[-1]) < 2:
+            keyboard.append([])
+        keyboard[-1].append(types.KeyboardButton(project.name))
+    if keyboard:
+        await UpdateProjectSettingsForm.project_name.set()
+        await message.reply(
+            'Выберите проект',
+            reply_markup=types.ReplyKeyboardMarkup(keyboard=keyboard, selective=True)
+        )
+    else:
+        await message.reply('У вас нет проектов')
 
 
 @updateprojectsettings.message_handler(state=UpdateProjectSettingsForm.project_name)
-async def receive_project_name(message: types.Message, user: User, state: FSMContext):
-    async with OrmSession() as session:
-        select_stmt = select(Project) \
-            .where(
-                Project.name == message.text,
-                Project.owner_user_id == user.id,
-            )
-        projects_result = await session.execute(select_stmt)
-        project = projects_result.scalars().first()
-        if project:
-            await state.update_data(project_id=project.id)
-            await UpdateProjectSettingsForm.next()
-            await message.reply(
-                'Проект ' + message.text + '\nПришлите, пожалуйста, json-файл с настройками',
-                reply_markup=types.ForceReply(selective=True)
-            )
-        else:
-            await message.reply(
-                f'Проекта "{message.text}" не существует'
-            )
+async def receive_project_name(message: types.Message, user: User, session: AsyncSession, state: FSMContext):
+    select_stmt = select(Project) \
+        .where(
+            Project.name == message.text,
+            Project.owner_user_id == user.id,
+        )
+    projects_result = await session.execute(select_stmt)
+    project = projects_result.scalars().first()
+    if project:
+        await state.update_data(project_id=project.id)
+        await UpdateProjectSettingsForm.next()
+        await message.reply(
+            'Проект ' + message.text + '\nПришлите, пожалуйста, json-файл с настройками',
+            reply_markup=types.ForceReply(selective=True)
+        )
+    else:
+        await message.reply(
+            f'Проекта "{message.text}" не существует'
+        )
 
 
 @updateprojectsettings.message_handler(content_types=types.ContentType.DOCUMENT,
                                        state=UpdateProjectSettingsForm.project_settigns_file)
-async def receive_new_project_settings(message: types.Message, user: User, state: FSMContext):
+async def receive_new_project_settings(message: types.Message, user: User, session: AsyncSession, state: FSMContext):
     file = await bot.get_file(message.document['file_id'])
     settings = io.BytesIO()
     await file.download(settings)
     try:
         s = json.load(settings)
-        async with OrmSession() as session:
-            async with state.proxy() as data:
-                project = await session.get(Project, data['project_id'])
-            project.settings = s
-            await session.commit()
+        if 'timezone' in s and not is_valid_timezone(s['timezone']):
+            await message.reply(
+                f'Неизвестный часовой пояс "{s["timezone"]}", пришлите другой файл',
+                reply_markup=types.ForceReply(selective=True)
+            )
+            return
+        async with state.proxy() as data:
+            project = await session.get(Project, data['project_id'])
+        project.settings = s
+        project.timezone = s.get('timezone', project.timezone)
+        await reschedule_project(session, project)
+        await session.commit()
+        project_cache.invalidate(project.chat_id)
         await message.reply(
             text(
                 text('Проект', project.name),
@@ -1,13 +1,17 @@
 import logging
+from contextvars import ContextVar
 from aiogram import types
 from aiogram.dispatcher.middlewares import BaseMiddleware, LifetimeControllerMiddleware
 from aiogram.dispatcher.handler import CancelHandler
-from auxy.db.models import User, Chat
+from auxy.db.models import User, Chat, Project
 from auxy.db import OrmSession
+from . import user_cache, chat_cache, project_cache
 
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
+update_session = ContextVar('update_session')
+update_failed = ContextVar('update_failed', default=False)
 
 
 class WhitelistMiddleware(BaseMiddleware):
@@ -42,34 +46,79 @@ class WhitelistMiddleware(BaseMiddleware):
             raise CancelHandler()
 
 
+class UpdateSessionMiddleware(LifetimeControllerMiddleware):
+    """
+    Opens a single session per update and injects it into handlers as ``session``.
+    What handlers leave uncommitted is committed once the update has been processed, or rolled back
+    if a handler or a middleware has failed. The session is closed along with the update in any case.
+    """
+    skip_patterns = ['error']
+
+    def setup(self, manager):
+        super().setup(manager)
+        # the dispatcher passes every failure of the update to error handlers before the update is post processed
+        manager.dispatcher.register_errors_handler(self.on_error)
+
+    async def on_error(self, update, exception):
+        update_failed.set(True)
+
+    async def pre_process(self, obj, data, *args):
+        if isinstance(obj, types.Update):
+            update_session.set(OrmSession())
+            update_failed.set(False)
+        else:
+            data['session'] = update_session.get()
+
+    async def post_process(self, obj, data, *args):
+        if not isinstance(obj, types.Update):
+            return
+        session = update_session.get()
+        try:
+            if update_failed.get():
+                await session.rollback()
+            else:
+                await session.commit()
+        finally:
+            await session.close()
+
+
 class GetOrCreateUserMiddleware(LifetimeControllerMiddleware):
+    """
+    Users are cached detached, handlers must not change them
+    """
     skip_patterns = ['error', 'update', 'channel_post', 'poll']
 
     async def pre_process(self, obj, data, *args):
         from_user = types.User.get_current()
-        async with OrmSession() as session:
-            # TODO take care about caching
-            user = await session.get(User, from_user.id)
-            data['user'] = user
-            data['is_new_user'] = False
-            if not data['user']:
-                dt = obj.date
-                log.info(f'Creating user @{from_user.username} with id {from_user.id}')
-                user = User(
+        created = []
+
+        # the load is shared with concurrent updates and outlives a cancelled one, so it has its own session
+        async def get_or_create():
+            async with OrmSession() as session:
+                user, inserted = await User.upsert(
+                    session,
                     id=from_user.id,
                     username=from_user.username,
                     first_name=from_user.first_name,
                     last_name=from_user.last_name,
                     lang=from_user.language_code,
-                    joined_dt=dt
+                    joined_dt=obj.date
                 )
-                session.add(user)
                 await session.commit()
-                data['user'] = user
-                data['is_new_user'] = True
+            if inserted:
+                log.info(f'Created user @{from_user.username} with id {from_user.id}')
+                created.append(user)
+            return user
+
+        data['user'] = await user_cache.get_or_load(from_user.id, get_or_create)
+        # concurrent updates of a new user share the load, only one of them greets
+        data['is_new_user'] = bool(created)
 
 
 class GetOrCreateChatMiddleware(LifetimeControllerMiddleware):
+    """
+    Chats are cached detached, handlers must not change them
+    """
     skip_patterns = ['error', 'update', 'inline_query', 'chosen_inline_result', 'callback_query'
                      'shipping_query', 'pre_checkout_query', 'poll', 'poll_answer']
 
@@ -78,21 +127,41 @@ class GetOrCreateChatMiddleware(LifetimeControllerMiddleware):
             sender_chat = types.ChatMemberUpdated.get_current().chat
         else:
             sender_chat = types.Chat.get_current()
-        async with OrmSession() as session:
-            # TODO take care about caching
-            chat = await session.get(Chat, sender_chat.id)
-            data['chat'] = chat
-            data['is_new_chat'] = False
-            if not data['chat']:
-                dt = obj.date
-                log.info(f'Creating chat @{sender_chat.username} with id {sender_chat.id}')
-                chat = Chat(
+        created = []
+
+        async def get_or_create():
+            async with OrmSession() as session:
+                chat, inserted = await Chat.upsert(
+                    session,
                     id=sender_chat.id,
                     type=sender_chat.type,
                     username=sender_chat.username,
-                    joined_dt=dt
+                    joined_dt=obj.date
                 )
-                session.add(chat)
                 await session.commit()
-                data['chat'] = chat
-                data['is_new_chat'] = True
+            if inserted:
+                log.info(f'Created chat @{sender_chat.username} with id {sender_chat.id}')
+                created.append(chat)
+            return chat
+
+        data['chat'] = await chat_cache.get_or_load(sender_chat.id, get_or_create)
+        data['is_new_chat'] = bool(created)
+
+
+class GetProjectMiddleware(LifetimeControllerMiddleware):
+    """
+    Resolves the project of the chat through the project cache, so handlers get it without a query.
+    Projects are cached detached, handlers must not change them.
+    """
+    skip_patterns = GetOrCreateChatMiddleware.skip_patterns
+
+    async def pre_process(self, obj, data, *args):
+        chat = data.get('chat')
+        if chat is None:
+            return
+
+        async def load():
+            async with OrmSession() as session:
+                return await Project.get_for_chat(session, chat.id)
+
+        data['project'] = await project_cache.get_or_load(chat.id, load)
@@ -0,0 +1,151 @@
+import asyncio
+import io
+import logging
+from datetime import datetime, timedelta
+import pytz
+from aiogram import types
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from auxy.settings import NOTIFICATION_CONCURRENCY, REPLICA_ID, OUTBOX_BATCH, OUTBOX_POLL_INTERVAL, \
+    OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY, OUTBOX_MAX_RETRY_DELAY, OUTBOX_LEASE_TIMEOUT
+from auxy.db import OrmSession
+from auxy.db.models import OutboxMessage
+from auxy.utils import OutboxMessageStatus
+from auxy.delivery import get_delivery_result, is_permanent_error
+from . import bot, throttler
+
+
+log = logging.getLogger(__name__)
+
+_new_messages_event = None
+
+
+def get_new_messages_event() -> asyncio.Event:
+    global _new_messages_event
+    if _new_messages_event is None:
+        _new_messages_event = asyncio.Event()
+    return _new_messages_event
+
+
+def message(text, **kwargs):
+    return 'send_message', dict(text=text, **kwargs)
+
+
+def document(content, filename, **kwargs):
+    return 'send_document', dict(content=content, filename=filename, **kwargs)
+
+
+async def enqueue(session, chat_id, method, payload, dedup_key=None):
+    """
+    Adds the message to the outbox in the session transaction, messages with an already known
+    ``dedup_key`` are ignored. Call ``notify_senders`` after the commit to send them right away.
+    """
+    now = datetime.now(pytz.utc)
+    insert_stmt = insert(OutboxMessage) \
+        .values(
+            chat_id=chat_id,
+            method=method,
+            payload=payload,
+            dedup_key=dedup_key,
+            status=OutboxMessageStatus.pending,
+            attempts=0,
+            created_dt=now,
+            next_attempt_at=now,
+        ) \
+        .on_conflict_do_nothing(index_elements=['dedup_key'])
+    await session.execute(insert_stmt)
+
+
+def notify_senders():
+    get_new_messages_event().set()
+
+
+async def claim_outbox_messages(now, limit):
+    async with OrmSession() as session:
+        select_stmt = select(OutboxMessage) \
+            .where(
+                OutboxMessage.status == OutboxMessageStatus.pending,
+                OutboxMessage.next_attempt_at <= now,
+                or_(OutboxMessage.locked_until.is_(None), OutboxMessage.locked_until < now),
+            ) \
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id) \
+            .limit(limit) \
+            .with_for_update(skip_locked=True)
+        messages = (await session.execute(select_stmt)).scalars().all()
+        for outbox_message in messages:
+            outbox_message.locked_by = REPLICA_ID
+            outbox_message.locked_until = now + timedelta(seconds=OUTBOX_LEASE_TIMEOUT)
+        await session.commit()
+    return messages
+
+
+def build_request(outbox_message: OutboxMessage):
+    payload = dict(outbox_message.payload)
+    if outbox_message.method == 'send_document':
+        content = payload.pop('content').encode('utf-8')
+        filename = payload.pop('filename')
+        return lambda: bot.send_document(
+            outbox_message.chat_id,
+            types.InputFile(io.BytesIO(content), filename=filename),
+            **payload
+        )
+    return lambda: getattr(bot, outbox_message.method)(outbox_message.chat_id, **payload)
+
+
+async def deliver(outbox_message: OutboxMessage):
+    error = None
+    try:
+        await throttler.call(outbox_message.chat_id, build_request(outbox_message))
+    except Exception as e:
+        error = e
+        if is_permanent_error(e):
+            log.warning('Outbox message#%s will never be delivered: %s', outbox_message.id, e)
+        else:
+            log.exception('Outbox message#%s delivery attempt has failed', outbox_message.id)
+    now = datetime.now(pytz.utc)
+    values = get_delivery_result(
+        outbox_message.attempts + 1, error, now, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY, OUTBOX_MAX_RETRY_DELAY
+    )
+    if error is None:
+        log.info(
+            'Outbox message#%s has been delivered to chat %s in %.3f seconds',
+            outbox_message.id, outbox_message.chat_id, (now - outbox_message.created_dt).total_seconds()
+        )
+    try:
+        async with OrmSession() as session:
+            # the lease could have expired and the message could have been taken over meanwhile
+            update_stmt = update(OutboxMessage) \
+                .where(OutboxMessage.id == outbox_message.id, OutboxMessage.locked_by == REPLICA_ID) \
+                .values(**values)
+            await session.execute(update_stmt)
+            await session.commit()
+    except Exception:
+        log.exception('Outbox message#%s delivery result has not been saved', outbox_message.id)
+
+
+async def outbox_sending_loop():
+    """
+    Keeps up to AUXY_NOTIFICATION_CONCURRENCY messages in delivery, so a slow chat
+    holds only its own slot
+    """
+    in_flight = set()
+    new_messages_event = get_new_messages_event()
+
+    def on_delivered(task):
+        in_flight.discard(task)
+        new_messages_event.set()
+
+    while True:
+        new_messages_event.clear()
+        free_slots = min(NOTIFICATION_CONCURRENCY - len(in_flight), OUTBOX_BATCH)
+        if free_slots > 0:
+            messages = await claim_outbox_messages(datetime.now(pytz.utc), free_slots)
+            for outbox_message in messages:
+                task = asyncio.ensure_future(deliver(outbox_message))
+                in_flight.add(task)
+                task.add_done_callback(on_delivered)
+        try:
+            await asyncio.wait_for(new_messages_event.wait(), OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
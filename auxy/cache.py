@@ -0,0 +1,88 @@
+import asyncio
+import collections
+import functools
+import time
+
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire ``ttl`` seconds after they have been put,
+    so changes made elsewhere, e.g. by another replica, are picked up eventually.
+
+    ``None`` values mean nothing has been found, they expire after ``negative_ttl``
+    to notice new rows sooner.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float = None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._loading = {}
+
+    def get(self, key, default=MISSING):
+        """
+        ``None`` can be cached too, so a miss is told by ``default``
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= self._clock():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, key, load):
+        """
+        Returns the cached value or awaits the ``load`` coroutine function and caches its result.
+        Concurrent misses of the same key share a single load, failed loads are not cached.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        loading = self._loading.get(key)
+        if loading is None:
+            self.loads += 1
+            loading = self._loading[key] = asyncio.ensure_future(load())
+            loading.add_done_callback(functools.partial(self._on_loaded, key))
+        # a cancelled caller must not cancel the load others are waiting for
+        return await asyncio.shield(loading)
+
+    def _on_loaded(self, key, loading):
+        # an invalidated load is still returned to its callers, but not cached
+        if self._loading.get(key) is not loading:
+            return
+        del self._loading[key]
+        if not loading.cancelled() and loading.exception() is None:
+            self.put(key, loading.result())
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+        self._loading.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+
+    def get_stats(self) -> dict:
+        return dict(size=len(self._entries), hits=self.hits, misses=self.misses, loads=self.loads)
+
+    def __len__(self):
+        return len(self._entries)
@@ -3,6 +3,7 @@ from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy import text
 
 from alembic import context
 
@@ -22,6 +23,8 @@ fileConfig(config.config_file_name)
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+MIGRATIONS_LOCK_ID = 2
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -67,6 +70,8 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
+        # bot replicas may start at the same time, only one of them runs migrations at once
+        connection.execute(text('SELECT pg_advisory_lock(:lock_id)'), {'lock_id': MIGRATIONS_LOCK_ID})
         context.configure(
             connection=connection, target_metadata=target_metadata
         )
@@ -0,0 +1,26 @@
+"""Add notification schedule leases
+
+Revision ID: 0374904ca1c5
+Revises: c863eca9b063
+Create Date: 2026-10-18 12:40:08.581940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0374904ca1c5'
+down_revision = 'c863eca9b063'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('notification_schedule', sa.Column('locked_by', sa.String(length=256), nullable=True))
+    op.add_column('notification_schedule', sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('notification_schedule', 'locked_until')
+    op.drop_column('notification_schedule', 'locked_by')
@@ -0,0 +1,48 @@
+"""Add indexes for hot lookups
+
+Revision ID: 0565d3c0dab6
+Revises: d0d3a488332d
+Create Date: 2026-10-18 19:07:12.480915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0565d3c0dab6'
+down_revision = 'd0d3a488332d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # links without an end or repeated ones mean nothing, the primary key can not be built with them
+    op.execute('DELETE FROM item_in_list WHERE item_id IS NULL OR list_id IS NULL')
+    op.execute(
+        """
+        DELETE FROM item_in_list a USING item_in_list b
+        WHERE a.item_id = b.item_id AND a.list_id = b.list_id AND a.ctid > b.ctid
+        """
+    )
+    op.alter_column('item_in_list', 'item_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('item_in_list', 'list_id', existing_type=sa.Integer(), nullable=False)
+    # indexes are built without blocking writes, which is impossible inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_projects_chat_id', 'projects', ['chat_id'], postgresql_concurrently=True)
+        op.create_index('ix_item_notes_item_id', 'item_notes', ['item_id'], postgresql_concurrently=True)
+        op.create_index('ix_item_in_list_item_id', 'item_in_list', ['item_id'], postgresql_concurrently=True)
+        op.create_index(
+            'item_in_list_pkey', 'item_in_list', ['list_id', 'item_id'], unique=True, postgresql_concurrently=True
+        )
+    op.execute('ALTER TABLE item_in_list ADD CONSTRAINT item_in_list_pkey PRIMARY KEY USING INDEX item_in_list_pkey')
+
+
+def downgrade():
+    op.drop_constraint('item_in_list_pkey', 'item_in_list', type_='primary')
+    op.alter_column('item_in_list', 'list_id', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('item_in_list', 'item_id', existing_type=sa.Integer(), nullable=True)
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_item_in_list_item_id', table_name='item_in_list', postgresql_concurrently=True)
+        op.drop_index('ix_item_notes_item_id', table_name='item_notes', postgresql_concurrently=True)
+        op.drop_index('ix_projects_chat_id', table_name='projects', postgresql_concurrently=True)
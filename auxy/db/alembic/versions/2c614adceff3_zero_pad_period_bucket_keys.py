@@ -0,0 +1,55 @@
+"""Zero-pad period bucket keys
+
+Revision ID: 2c614adceff3
+Revises: c58b69742e7c
+Create Date: 2026-10-18 17:48:05.263801
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c614adceff3'
+down_revision = 'c58b69742e7c'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+
+def update_keys_in_batches(pattern, replacement):
+    # every batch is committed on its own to keep row locks short on a live table,
+    # keys already taken by another list of the project are left as they are
+    update_stmt = sa.text(
+        """
+        UPDATE items_lists SET period_bucket_key = regexp_replace(period_bucket_key, :pattern, :replacement)
+        WHERE id IN (
+            SELECT il.id FROM items_lists il
+            WHERE il.period_bucket_key ~ :pattern
+                AND NOT EXISTS (
+                    SELECT 1 FROM items_lists other
+                    WHERE other.project_id = il.project_id
+                        AND other.period_bucket_key = regexp_replace(il.period_bucket_key, :pattern, :replacement)
+                )
+            LIMIT :batch_size
+        )
+        """
+    )
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        while True:
+            result = connection.execute(
+                update_stmt, {'pattern': pattern, 'replacement': replacement, 'batch_size': BATCH_SIZE}
+            )
+            if result.rowcount < BATCH_SIZE:
+                break
+
+
+def upgrade():
+    update_keys_in_batches(r'^(week|month)-(\d{4})-(\d)$', r'\1-\2-0\3')
+
+
+def downgrade():
+    update_keys_in_batches(r'^(week|month)-(\d{4})-0(\d)$', r'\1-\2-\3')
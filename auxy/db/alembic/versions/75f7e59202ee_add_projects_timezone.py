@@ -0,0 +1,27 @@
+"""Add projects timezone
+
+Revision ID: 75f7e59202ee
+Revises: b32f69503915
+Create Date: 2026-10-18 16:10:21.482930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '75f7e59202ee'
+down_revision = 'b32f69503915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'projects',
+        sa.Column('timezone', sa.String(length=64), server_default='Asia/Novosibirsk', nullable=False)
+    )
+
+
+def downgrade():
+    op.drop_column('projects', 'timezone')
@@ -0,0 +1,40 @@
+"""Add imported ids
+
+Revision ID: 9e3d8d5a74dd
+Revises: 0565d3c0dab6
+Create Date: 2026-10-18 21:02:37.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3d8d5a74dd'
+down_revision = '0565d3c0dab6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('imported_items',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('external_id', sa.BigInteger(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('project_id', 'external_id')
+    )
+    op.create_table('imported_notes',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('external_id', sa.BigInteger(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['note_id'], ['item_notes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('project_id', 'external_id')
+    )
+
+
+def downgrade():
+    op.drop_table('imported_notes')
+    op.drop_table('imported_items')
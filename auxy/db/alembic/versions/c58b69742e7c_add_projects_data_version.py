@@ -0,0 +1,24 @@
+"""Add projects data version
+
+Revision ID: c58b69742e7c
+Revises: 75f7e59202ee
+Create Date: 2026-10-18 17:02:37.915416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58b69742e7c'
+down_revision = '75f7e59202ee'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('projects', sa.Column('data_version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('projects', 'data_version')
@@ -0,0 +1,32 @@
+"""Add notification schedule
+
+Revision ID: c863eca9b063
+Revises: 869c096b3a3f
+Create Date: 2026-10-18 10:12:31.218374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c863eca9b063'
+down_revision = '869c096b3a3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_schedule',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=64), nullable=False),
+    sa.Column('next_fire_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('project_id', 'action')
+    )
+    op.create_index('ix_notification_schedule_next_fire_at', 'notification_schedule', ['next_fire_at'])
+
+
+def downgrade():
+    op.drop_index('ix_notification_schedule_next_fire_at', table_name='notification_schedule')
+    op.drop_table('notification_schedule')
@@ -0,0 +1,51 @@
+"""Add bucket stats
+
+Revision ID: d0d3a488332d
+Revises: 2c614adceff3
+Create Date: 2026-10-18 18:21:44.603127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0d3a488332d'
+down_revision = '2c614adceff3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bucket_stats',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('period_bucket_key', sa.String(length=32), nullable=False),
+    sa.Column('active', sa.Integer(), nullable=False),
+    sa.Column('done', sa.Integer(), nullable=False),
+    sa.Column('rejected', sa.Integer(), nullable=False),
+    sa.Column('notes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('project_id', 'period_bucket_key')
+    )
+    op.execute(
+        """
+        INSERT INTO bucket_stats (project_id, period_bucket_key, active, done, rejected, notes)
+        SELECT
+            il.project_id,
+            il.period_bucket_key,
+            count(DISTINCT i.id) FILTER (WHERE i.status = 'active'),
+            count(DISTINCT i.id) FILTER (WHERE i.status = 'done'),
+            count(DISTINCT i.id) FILTER (WHERE i.status = 'rejected'),
+            count(n.id)
+        FROM items_lists il
+            LEFT OUTER JOIN item_in_list iil ON iil.list_id = il.id
+            LEFT OUTER JOIN items i ON i.id = iil.item_id
+            LEFT OUTER JOIN item_notes n ON n.item_id = i.id
+        WHERE il.project_id IS NOT NULL AND il.period_bucket_key IS NOT NULL
+        GROUP BY il.project_id, il.period_bucket_key
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('bucket_stats')
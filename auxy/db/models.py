@@ -1,13 +1,39 @@
+from collections import defaultdict
 from sqlalchemy.orm import declarative_base, relationship, selectinload
 from sqlalchemy.future import select
-from sqlalchemy import Table, Column, Integer, String, DateTime, JSON, Text, ForeignKey, Enum, BigInteger
-from sqlalchemy.schema import UniqueConstraint
-from auxy.utils import PeriodBucket, PeriodBucketModes, ItemStatus
+from sqlalchemy import Table, Column, Integer, String, DateTime, JSON, Text, ForeignKey, Enum, BigInteger, Index, \
+    Boolean, tuple_, or_, and_, update, func, distinct, cast, text, literal_column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.schema import UniqueConstraint, PrimaryKeyConstraint
+from auxy.utils import PeriodBucket, PeriodBucketModes, ItemStatus, OutboxMessageStatus
+from auxy.timezones import DEFAULT_TIMEZONE, get_timezone
+from auxy.imports import HISTORY_COLUMNS
 
 
 Base = declarative_base()
 
 
+async def upsert_returning_inserted(session, model, values: dict, update_columns):
+    """
+    Inserts the row or updates ``update_columns`` of the existing one with a single statement,
+    so concurrent calls do not race. Returns the persistent object and whether it has been inserted:
+    xmax of a row version is zero unless it has been produced by an update.
+    """
+    insert_stmt = insert(model).values(**values)
+    insert_stmt = insert_stmt \
+        .on_conflict_do_update(
+            index_elements=['id'],
+            set_={column: insert_stmt.excluded[column] for column in update_columns}
+        ) \
+        .returning(*model.__table__.columns, (literal_column('xmax') == 0).label('inserted'))
+    select_stmt = select(model, literal_column('inserted', Boolean)) \
+        .from_statement(insert_stmt) \
+        .execution_options(populate_existing=True)
+    upsert_result = await session.execute(select_stmt)
+    return upsert_result.one()
+
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -19,6 +45,13 @@ class User(Base):
     joined_dt = Column(DateTime(timezone=True), nullable=False)
     projects = relationship("Project")
 
+    @staticmethod
+    async def upsert(session, **values):
+        """
+        Creates the user or keeps the profile of the existing one current, joined_dt is never changed
+        """
+        return await upsert_returning_inserted(session, User, values, ['username', 'first_name', 'last_name', 'lang'])
+
 
 class Chat(Base):
     __tablename__ = 'chats'
@@ -28,6 +61,10 @@ class Chat(Base):
     username = Column(String(256))
     joined_dt = Column(DateTime(timezone=True), nullable=False)
 
+    @staticmethod
+    async def upsert(session, **values):
+        return await upsert_returning_inserted(session, Chat, values, ['type', 'username'])
+
 
 class Project(Base):
     __tablename__ = 'projects'
@@ -35,12 +72,48 @@ class Project(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(256), nullable=False)
     owner_user_id = Column(BigInteger, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-    chat_id = Column(BigInteger, ForeignKey('chats.id', ondelete='CASCADE'), nullable=False)
+    chat_id = Column(BigInteger, ForeignKey('chats.id', ondelete='CASCADE'), nullable=False, index=True)
     created_dt = Column(DateTime(timezone=True), nullable=False)
     period_bucket_mode = Column(Enum(PeriodBucketModes))
     settings = Column(JSON, nullable=False)
+    timezone = Column(String(64), nullable=False, default=DEFAULT_TIMEZONE, server_default=DEFAULT_TIMEZONE)
+    data_version = Column(BigInteger, nullable=False, default=0, server_default='0')
     __table_args__ = (UniqueConstraint('owner_user_id', 'name', name='projects_owner_user_id_name_key'),)
 
+    def to_local_time(self, dt):
+        """
+        Naive datetimes, e.g. aiogram message dates, are treated as the server local time
+        """
+        return dt.astimezone(get_timezone(self.timezone))
+
+    @staticmethod
+    async def get_for_chat(session, chat_id):
+        """
+        The first project of the chat is the one all chat commands work with
+        """
+        select_stmt = select(Project) \
+            .where(
+                Project.chat_id == chat_id
+            ) \
+            .order_by(Project.id)
+        projects_result = await session.execute(select_stmt)
+        return projects_result.scalars().first()
+
+    @staticmethod
+    async def get_data_version(session, project_id):
+        select_stmt = select(Project.data_version).where(Project.id == project_id)
+        return (await session.execute(select_stmt)).scalar_one()
+
+    @staticmethod
+    async def bump_data_version(session, project_id):
+        """
+        Marks items of the project as changed, so reports rendered before are not reused
+        """
+        update_stmt = update(Project) \
+            .where(Project.id == project_id) \
+            .values(data_version=Project.data_version + 1)
+        await session.execute(update_stmt)
+
     async def get_for_period(self, session, period_bucket: PeriodBucket, with_log_messages=False):
         opts = selectinload(ItemsList.items.and_(Item.status == ItemStatus.active))
         if with_log_messages:
@@ -54,7 +127,13 @@ class Project(Base):
         items_lists_result = await session.execute(select_stmt)
         return items_lists_result.scalars().first()
 
-    async def get_since(self, session, start_day: PeriodBucket, with_log_messages=False):
+    async def get_range(self, session, start_bucket: PeriodBucket, end_bucket: PeriodBucket,
+                        after_key=None, limit=None, with_log_messages=False):
+        """
+        Loads items lists from ``start_bucket`` to ``end_bucket`` inclusive ordered by their keys.
+
+        With ``limit`` only a page is loaded, the next one starts after the key of the last loaded list.
+        """
         opts = selectinload(ItemsList.items)
         if with_log_messages:
             opts = opts.selectinload(Item.notes)
@@ -62,11 +141,258 @@ class Project(Base):
             .options(opts) \
             .where(
                 ItemsList.project_id == self.id,
-                ItemsList.period_bucket_key >= start_day.key(),
+                ItemsList.period_bucket_key >= start_bucket.key(),
+                ItemsList.period_bucket_key <= end_bucket.key(),
+            ) \
+            .order_by(ItemsList.period_bucket_key)
+        if after_key is not None:
+            select_stmt = select_stmt.where(ItemsList.period_bucket_key > after_key)
+        if limit is not None:
+            select_stmt = select_stmt.limit(limit)
+        items_lists_result = await session.execute(select_stmt)
+        return items_lists_result.scalars().all()
+
+    async def iter_range(self, session, start_bucket: PeriodBucket, end_bucket: PeriodBucket, page_size,
+                         with_log_messages=False):
+        """
+        Yields pages of ``get_range`` until the whole range is loaded
+        """
+        after_key = None
+        while True:
+            items_lists = await self.get_range(
+                session, start_bucket, end_bucket, after_key, page_size, with_log_messages=with_log_messages
+            )
+            if items_lists:
+                yield items_lists
+            if len(items_lists) < page_size:
+                break
+            after_key = items_lists[-1].period_bucket_key
+
+    async def get_range_stats(self, session, start_bucket: PeriodBucket, end_bucket: PeriodBucket):
+        """
+        Counts items by status and their notes for every items list of the range, nothing is hydrated
+        """
+        select_stmt = select_items_lists_stats(ItemsList.period_bucket_key) \
+            .where(
+                ItemsList.project_id == self.id,
+                ItemsList.period_bucket_key >= start_bucket.key(),
+                ItemsList.period_bucket_key <= end_bucket.key(),
             ) \
             .order_by(ItemsList.period_bucket_key)
+        stats_result = await session.execute(select_stmt)
+        return stats_result.all()
+
+    async def get_bucket_stats(self, session):
+        """
+        Reads the rollup for the whole history of the project, one row per items list
+        """
+        select_stmt = select(
+                BucketStats.period_bucket_key,
+                BucketStats.active,
+                BucketStats.done,
+                BucketStats.rejected,
+                BucketStats.notes,
+            ) \
+            .where(BucketStats.project_id == self.id) \
+            .order_by(BucketStats.period_bucket_key)
+        stats_result = await session.execute(select_stmt)
+        return stats_result.all()
+
+    def select_history(self):
+        """
+        Selects every item of the project with its period and notes, one row per note
+        """
+        return select(
+                ItemsList.period_bucket_key,
+                Item.id.label('item_id'),
+                Item.text.label('item_text'),
+                cast(Item.status, String).label('item_status'),
+                Item.created_dt.label('item_created_dt'),
+                ItemNote.id.label('note_id'),
+                ItemNote.text.label('note_text'),
+                ItemNote.created_dt.label('note_created_dt'),
+            ) \
+            .select_from(ItemsList) \
+            .join(item_in_list_table, item_in_list_table.c.list_id == ItemsList.id) \
+            .join(Item, Item.id == item_in_list_table.c.item_id) \
+            .outerjoin(ItemNote, ItemNote.item_id == Item.id) \
+            .where(ItemsList.project_id == self.id) \
+            .order_by(ItemsList.period_bucket_key, Item.id, ItemNote.id)
+
+    async def copy_history_to(self, session, file):
+        """
+        Writes the history to the binary file as CSV with ``COPY ... TO STDOUT``,
+        rows go from the server to the file without being parsed
+        """
+        query = self.select_history().compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_from_query(str(query), output=file, format='csv', header=True)
+
+    async def stream_history(self, session):
+        """
+        Yields history rows fetched from a server-side cursor
+        """
+        history_result = await session.stream(self.select_history())
+        async for row in history_result:
+            yield row
+
+    async def import_history(self, session, rows):
+        """
+        Copies rows of the /export format from the async iterable to a staging table
+        and merges them into the project with a few set-based statements.
+        Items and notes imported before are skipped, so the same history can be sent again.
+        Returns the number of read rows, nothing is imported if iterating fails.
+        """
+        # concurrent imports to the project would allocate new items for the same external ids
+        await session.execute(select(Project.id).where(Project.id == self.id).with_for_update())
+        await session.execute(text(
+            """
+            CREATE TEMPORARY TABLE import_history (
+                period_bucket_key varchar(32) NOT NULL,
+                item_id bigint NOT NULL,
+                item_text text NOT NULL,
+                item_status varchar(32) NOT NULL,
+                item_created_dt timestamptz NOT NULL,
+                note_id bigint,
+                note_text text,
+                note_created_dt timestamptz
+            ) ON COMMIT DROP
+            """
+        ))
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        copy_result = await raw_connection.driver_connection.copy_records_to_table(
+            'import_history', records=rows, columns=list(HISTORY_COLUMNS)
+        )
+        params = {'project_id': self.id}
+        await session.execute(text(
+            """
+            INSERT INTO items_lists (project_id, created_dt, period_bucket_key)
+            SELECT :project_id, min(item_created_dt), period_bucket_key FROM import_history GROUP BY period_bucket_key
+            ON CONFLICT (project_id, period_bucket_key) DO NOTHING
+            """
+        ), params)
+        # ids of new items are allocated beforehand, so items and their mapping are inserted without lookups
+        await session.execute(text(
+            """
+            CREATE TEMPORARY TABLE import_history_items ON COMMIT DROP AS
+            SELECT DISTINCT ON (item_id) item_id AS external_id,
+                nextval(pg_get_serial_sequence('items', 'id')) AS id,
+                item_text, item_status, item_created_dt
+            FROM import_history h
+            WHERE NOT EXISTS (
+                SELECT FROM imported_items m WHERE m.project_id = :project_id AND m.external_id = h.item_id
+            )
+            ORDER BY item_id
+            """
+        ), params)
+        await session.execute(text(
+            """
+            INSERT INTO items (id, project_id, text, status, created_dt)
+            SELECT id, :project_id, item_text, item_status, item_created_dt FROM import_history_items
+            """
+        ), params)
+        await session.execute(text(
+            """
+            INSERT INTO imported_items (project_id, external_id, item_id)
+            SELECT :project_id, external_id, id FROM import_history_items
+            """
+        ), params)
+        await session.execute(text(
+            """
+            INSERT INTO item_in_list (item_id, list_id)
+            SELECT DISTINCT m.item_id, il.id
+            FROM import_history h
+                JOIN imported_items m ON m.project_id = :project_id AND m.external_id = h.item_id
+                JOIN items_lists il ON il.project_id = :project_id AND il.period_bucket_key = h.period_bucket_key
+            ON CONFLICT DO NOTHING
+            """
+        ), params)
+        await session.execute(text(
+            """
+            CREATE TEMPORARY TABLE import_history_notes ON COMMIT DROP AS
+            SELECT n.note_id AS external_id,
+                nextval(pg_get_serial_sequence('item_notes', 'id')) AS id,
+                m.item_id, n.note_text, n.note_created_dt
+            FROM (
+                SELECT DISTINCT ON (note_id) item_id, note_id, note_text, note_created_dt
+                FROM import_history
+                WHERE note_id IS NOT NULL
+                ORDER BY note_id
+            ) n
+                JOIN imported_items m ON m.project_id = :project_id AND m.external_id = n.item_id
+            WHERE NOT EXISTS (
+                SELECT FROM imported_notes mn WHERE mn.project_id = :project_id AND mn.external_id = n.note_id
+            )
+            ORDER BY n.note_id
+            """
+        ), params)
+        await session.execute(text(
+            """
+            INSERT INTO item_notes (id, item_id, project_id, text, created_dt)
+            SELECT id, item_id, :project_id, note_text, note_created_dt FROM import_history_notes
+            """
+        ), params)
+        await session.execute(text(
+            """
+            INSERT INTO imported_notes (project_id, external_id, note_id)
+            SELECT :project_id, external_id, id FROM import_history_notes
+            """
+        ), params)
+        await session.execute(text('DROP TABLE import_history, import_history_items, import_history_notes'))
+        await BucketStats.refresh(session, ItemsList.project_id == self.id)
+        await Project.bump_data_version(session, self.id)
+        return int(copy_result.split()[-1])
+
+    @staticmethod
+    async def get_for_periods(session, period_buckets, with_log_messages=False):
+        """
+        Loads items lists of several projects at once, ``period_buckets`` maps project ids to buckets
+        """
+        opts = selectinload(ItemsList.items)
+        if with_log_messages:
+            opts = opts.selectinload(Item.notes)
+        select_stmt = select(ItemsList) \
+            .options(opts) \
+            .where(
+                tuple_(ItemsList.project_id, ItemsList.period_bucket_key).in_([
+                    (project_id, period_bucket.key()) for project_id, period_bucket in period_buckets.items()
+                ]),
+            )
         items_lists_result = await session.execute(select_stmt)
-        return items_lists_result.scalars()
+        return {items_list.project_id: items_list for items_list in items_lists_result.scalars()}
+
+    @staticmethod
+    async def get_range_for_projects(session, bucket_ranges, with_log_messages=False):
+        """
+        Loads items lists of several projects at once,
+        ``bucket_ranges`` maps project ids to pairs of the first and the last buckets
+        """
+        projects_ids_by_range = defaultdict(list)
+        for project_id, (start_bucket, end_bucket) in bucket_ranges.items():
+            projects_ids_by_range[(start_bucket.key(), end_bucket.key())].append(project_id)
+        opts = selectinload(ItemsList.items)
+        if with_log_messages:
+            opts = opts.selectinload(Item.notes)
+        select_stmt = select(ItemsList) \
+            .options(opts) \
+            .where(
+                or_(*[
+                    and_(
+                        ItemsList.project_id.in_(projects_ids),
+                        ItemsList.period_bucket_key >= start_key,
+                        ItemsList.period_bucket_key <= end_key,
+                    )
+                    for (start_key, end_key), projects_ids in projects_ids_by_range.items()
+                ]),
+            ) \
+            .order_by(ItemsList.period_bucket_key)
+        items_lists_result = await session.execute(select_stmt)
+        items_lists = {project_id: [] for project_id in bucket_ranges}
+        for items_list in items_lists_result.scalars():
+            items_lists[items_list.project_id].append(items_list)
+        return items_lists
 
     async def create_new_for_period_with_items_or_append_to_existing(self, session, period: PeriodBucket, now, str_items):
         created = False
@@ -88,12 +414,30 @@ class Project(Base):
             )
             session.add(item)
             items_list.items.append(item)
+        await Project.bump_data_version(session, self.id)
+        await BucketStats.refresh_for_bucket(session, self.id, period)
         return created
 
 
 item_in_list_table = Table('item_in_list', Base.metadata,
-    Column('item_id', Integer, ForeignKey('items.id')),
-    Column('list_id', Integer, ForeignKey('items_lists.id'))
+    Column('item_id', Integer, ForeignKey('items.id'), nullable=False, index=True),
+    Column('list_id', Integer, ForeignKey('items_lists.id'), nullable=False),
+    # items of a list are looked up by the leading column
+    PrimaryKeyConstraint('list_id', 'item_id', name='item_in_list_pkey'),
+)
+
+
+# ids of imported items and notes in the exported project, so importing the same history again adds nothing
+imported_items_table = Table('imported_items', Base.metadata,
+    Column('project_id', Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+    Column('external_id', BigInteger, primary_key=True),
+    Column('item_id', Integer, ForeignKey('items.id', ondelete='CASCADE'), nullable=False),
+)
+
+imported_notes_table = Table('imported_notes', Base.metadata,
+    Column('project_id', Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+    Column('external_id', BigInteger, primary_key=True),
+    Column('note_id', Integer, ForeignKey('item_notes.id', ondelete='CASCADE'), nullable=False),
 )
 
 
@@ -129,7 +473,132 @@ class ItemNote(Base):
     __tablename__ = 'item_notes'
 
     id = Column(Integer, primary_key=True)
-    item_id = Column(Integer, ForeignKey('items.id', ondelete='CASCADE'))
+    item_id = Column(Integer, ForeignKey('items.id', ondelete='CASCADE'), index=True)
     project_id = Column(Integer, ForeignKey('projects.id'))
     text = Column(Text, nullable=False)
     created_dt = Column(DateTime(timezone=True), nullable=False)
+
+
+def select_items_lists_stats(*group_by):
+    """
+    Counts items by status and their notes for every group of items lists
+    """
+    return select(
+            *group_by,
+            func.count(distinct(Item.id)).filter(Item.status == ItemStatus.active).label('active'),
+            func.count(distinct(Item.id)).filter(Item.status == ItemStatus.done).label('done'),
+            func.count(distinct(Item.id)).filter(Item.status == ItemStatus.rejected).label('rejected'),
+            func.count(ItemNote.id).label('notes'),
+        ) \
+        .select_from(ItemsList) \
+        .outerjoin(item_in_list_table, item_in_list_table.c.list_id == ItemsList.id) \
+        .outerjoin(Item, Item.id == item_in_list_table.c.item_id) \
+        .outerjoin(ItemNote, ItemNote.item_id == Item.id) \
+        .group_by(*group_by)
+
+
+class BucketStats(Base):
+    """
+    Rollup of ``select_items_lists_stats`` per items list, so long-range statistics
+    are read in O(buckets) without touching items and notes
+    """
+    __tablename__ = 'bucket_stats'
+
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    period_bucket_key = Column(String(32), primary_key=True)
+    active = Column(Integer, nullable=False, default=0)
+    done = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)
+    notes = Column(Integer, nullable=False, default=0)
+
+    @staticmethod
+    async def refresh(session, *whereclause):
+        """
+        Recounts rollup rows of the matching items lists in the session transaction,
+        only items and notes of those lists are scanned
+        """
+        # pending changes, e.g. a new item status, have to be counted too
+        await session.flush()
+        # a concurrent recount could miss changes of this transaction and overwrite the rows after it,
+        # so recounts of a list are serialized and the later one sees the committed changes of the earlier
+        await session.execute(
+            select(ItemsList.id).where(*whereclause).order_by(ItemsList.id).with_for_update(key_share=True)
+        )
+        select_stmt = select_items_lists_stats(ItemsList.project_id, ItemsList.period_bucket_key) \
+            .where(*whereclause)
+        insert_stmt = insert(BucketStats) \
+            .from_select(['project_id', 'period_bucket_key', 'active', 'done', 'rejected', 'notes'], select_stmt)
+        insert_stmt = insert_stmt \
+            .on_conflict_do_update(
+                index_elements=['project_id', 'period_bucket_key'],
+                set_={
+                    'active': insert_stmt.excluded.active,
+                    'done': insert_stmt.excluded.done,
+                    'rejected': insert_stmt.excluded.rejected,
+                    'notes': insert_stmt.excluded.notes,
+                }
+            )
+        await session.execute(insert_stmt)
+
+    @staticmethod
+    async def recount_all(session):
+        """
+        Recounts rollup rows of every project in its own transaction,
+        fixes rows left behind by changes made around ``refresh``, e.g. by hand in the database
+        """
+        project_ids = (await session.execute(select(Project.id).order_by(Project.id))).scalars().all()
+        for project_id in project_ids:
+            await BucketStats.refresh(session, ItemsList.project_id == project_id)
+            await session.commit()
+
+    @staticmethod
+    async def refresh_for_bucket(session, project_id, period_bucket: PeriodBucket):
+        await BucketStats.refresh(
+            session,
+            ItemsList.project_id == project_id,
+            ItemsList.period_bucket_key == period_bucket.key(),
+        )
+
+    @staticmethod
+    async def refresh_for_item(session, item_id):
+        """
+        Recounts every items list the item belongs to
+        """
+        await BucketStats.refresh(
+            session,
+            ItemsList.id.in_(select(item_in_list_table.c.list_id).where(item_in_list_table.c.item_id == item_id)),
+        )
+
+
+class NotificationSchedule(Base):
+    __tablename__ = 'notification_schedule'
+
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    action = Column(String(64), primary_key=True)
+    next_fire_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    locked_by = Column(String(256))
+    locked_until = Column(DateTime(timezone=True))
+
+
+class OutboxMessage(Base):
+    __tablename__ = 'outbox_messages'
+
+    id = Column(BigInteger, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    method = Column(String(32), nullable=False)
+    payload = Column(JSON, nullable=False)
+    dedup_key = Column(String(256), unique=True)
+    status = Column(Enum(OutboxMessageStatus), nullable=False, default=OutboxMessageStatus.pending)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    created_dt = Column(DateTime(timezone=True), nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    sent_dt = Column(DateTime(timezone=True))
+    locked_by = Column(String(256))
+    locked_until = Column(DateTime(timezone=True))
+    __table_args__ = (
+        Index(
+            'ix_outbox_messages_pending_next_attempt_at', 'next_attempt_at',
+            postgresql_where=(status == OutboxMessageStatus.pending)
+        ),
+    )
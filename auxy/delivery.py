@@ -0,0 +1,37 @@
+import typing
+from datetime import datetime, timedelta
+from aiogram.utils.exceptions import BadRequest, Unauthorized
+from auxy.utils import OutboxMessageStatus
+
+
+def get_retry_delay(attempts: int, retry_delay: float, max_retry_delay: float) -> float:
+    """
+    Doubles the delay after every failed attempt up to ``max_retry_delay`` seconds
+    """
+    return min(retry_delay * 2 ** (attempts - 1), max_retry_delay)
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    The bot has been blocked or the request itself is wrong, retrying will not help
+    """
+    return isinstance(error, (Unauthorized, BadRequest))
+
+
+def get_delivery_result(attempts: int, error: typing.Optional[Exception], now: datetime,
+                        max_attempts: int, retry_delay: float, max_retry_delay: float) -> dict:
+    """
+    Returns values to update the outbox message with after its ``attempts``-th delivery attempt,
+    ``error`` is None if it has succeeded. The lease is released in any case.
+    """
+    values = dict(locked_by=None, locked_until=None, attempts=attempts)
+    if error is None:
+        values.update(status=OutboxMessageStatus.sent, sent_dt=now)
+    elif is_permanent_error(error):
+        values.update(status=OutboxMessageStatus.failed, last_error=str(error))
+    elif attempts >= max_attempts:
+        values.update(status=OutboxMessageStatus.failed, last_error=repr(error))
+    else:
+        delay = timedelta(seconds=get_retry_delay(attempts, retry_delay, max_retry_delay))
+        values.update(last_error=repr(error), next_attempt_at=now + delay)
+    return values
@@ -0,0 +1,34 @@
+import enum
+import json
+import typing
+from datetime import datetime
+
+
+class ExportFormats(enum.Enum):
+    csv = 1
+    jsonl = 2
+
+
+def get_export_format(args: str) -> typing.Optional[ExportFormats]:
+    """
+    CSV is exported by default, ``None`` is returned for unknown formats
+    """
+    name = args.strip().lower() or ExportFormats.csv.name
+    return ExportFormats.__members__.get(name)
+
+
+def _to_json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+async def write_jsonl(rows: typing.AsyncIterable, file: typing.BinaryIO) -> int:
+    """
+    Writes every row as a JSON object on its own line in UTF-8, only one row is kept in memory
+    """
+    size = 0
+    async for row in rows:
+        line = json.dumps(dict(row._mapping), default=_to_json_value, ensure_ascii=False) + '\n'
+        size += file.write(line.encode('utf-8'))
+    return size
@@ -0,0 +1,127 @@
+import csv
+import json
+import typing
+from datetime import datetime
+from dateutil.parser import isoparse
+from auxy.utils import PeriodBucket, ItemStatus
+
+
+HISTORY_COLUMNS = (
+    'period_bucket_key', 'item_id', 'item_text', 'item_status', 'item_created_dt',
+    'note_id', 'note_text', 'note_created_dt',
+)
+
+
+class HistoryFormatError(ValueError):
+
+    def __init__(self, message: str, line_num: typing.Optional[int] = None):
+        super().__init__(message if line_num is None else f'строка {line_num}: {message}')
+        self.line_num = line_num
+
+
+class HistoryRow(typing.NamedTuple):
+    period_bucket_key: str
+    item_id: int
+    item_text: str
+    item_status: str
+    item_created_dt: datetime
+    note_id: typing.Optional[int]
+    note_text: typing.Optional[str]
+    note_created_dt: typing.Optional[datetime]
+
+
+def iter_lines(file: typing.BinaryIO) -> typing.Iterator[str]:
+    # a line break byte is never a part of a multibyte UTF-8 character, so lines are decoded one by one
+    for raw_line in file:
+        yield raw_line.decode('utf-8')
+
+
+def iter_csv_records(lines: typing.Iterable[str]) -> typing.Iterator[typing.Tuple[int, dict]]:
+    """
+    Yields records of the CSV written by /export along with their line numbers
+    """
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None or not set(HISTORY_COLUMNS) <= set(reader.fieldnames):
+        raise HistoryFormatError('в заголовке должны быть колонки ' + ', '.join(HISTORY_COLUMNS), 1)
+    for record in reader:
+        # empty CSV fields are NULLs written by COPY
+        yield reader.line_num, {key: value if value != '' else None for key, value in record.items()}
+
+
+def iter_jsonl_records(lines: typing.Iterable[str]) -> typing.Iterator[typing.Tuple[int, dict]]:
+    """
+    Yields records of the JSON Lines written by /export along with their line numbers
+    """
+    for line_num, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise HistoryFormatError('это не JSON', line_num)
+        if not isinstance(record, dict):
+            raise HistoryFormatError('ожидается JSON-объект', line_num)
+        yield line_num, record
+
+
+def _parse_int(value, nullable=False) -> typing.Optional[int]:
+    if value is None and nullable:
+        return None
+    if isinstance(value, bool):
+        raise ValueError('not a number')
+    return int(value)
+
+
+def _parse_dt(value, nullable=False) -> typing.Optional[datetime]:
+    if value is None and nullable:
+        return None
+    dt = isoparse(value)
+    if dt.tzinfo is None:
+        raise ValueError('no timezone')
+    return dt
+
+
+def _parse_text(value, nullable=False) -> typing.Optional[str]:
+    if value is None and nullable:
+        return None
+    if not isinstance(value, str) or not value:
+        raise ValueError('empty text')
+    return value
+
+
+def parse_history_record(line_num: int, record: dict) -> HistoryRow:
+    """
+    Validates the record and converts it to values ready to be copied to the database.
+    Period bucket keys are normalized, so unpadded ones are imported to the same lists.
+    """
+    values = []
+    for column, parse in [
+        ('period_bucket_key', lambda value: PeriodBucket.get_by_key(value).key()),
+        ('item_id', _parse_int),
+        ('item_text', _parse_text),
+        ('item_status', lambda value: ItemStatus[value].name),
+        ('item_created_dt', _parse_dt),
+        ('note_id', lambda value: _parse_int(value, nullable=True)),
+        ('note_text', lambda value: _parse_text(value, nullable=True)),
+        ('note_created_dt', lambda value: _parse_dt(value, nullable=True)),
+    ]:
+        try:
+            values.append(parse(record.get(column)))
+        except (ValueError, TypeError, KeyError, AttributeError, OverflowError):
+            raise HistoryFormatError(f'неправильное значение в колонке {column}', line_num)
+    row = HistoryRow(*values)
+    if (row.note_id is None) != (row.note_text is None) or (row.note_id is None) != (row.note_created_dt is None):
+        raise HistoryFormatError('у заметки должны быть note_id, note_text и note_created_dt', line_num)
+    return row
+
+
+def iter_history_rows(file: typing.BinaryIO, jsonl=False) -> typing.Iterator[HistoryRow]:
+    """
+    Reads and validates the history file row by row, the first wrong row stops the import
+    """
+    records = iter_jsonl_records(iter_lines(file)) if jsonl else iter_csv_records(iter_lines(file))
+    try:
+        for line_num, record in records:
+            yield parse_history_record(line_num, record)
+    except (UnicodeDecodeError, csv.Error):
+        raise HistoryFormatError('файл не похож на выгрузку /export в UTF-8')
@@ -0,0 +1,171 @@
+import bisect
+import collections
+import typing
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from auxy.timezones import localize
+
+
+class CronExpression:
+    """
+    Standard five-field cron expression: minute, hour, day of month, month and day of week.
+
+    Fields support ``*``, numbers, ranges, lists and steps, day of week is 0-7 with Sunday as 0 or 7.
+    """
+
+    __slots__ = ('minutes', 'hours', 'days', 'months', 'weekdays', '_any_day', '_any_weekday')
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'wrong cron expression "{expression}"')
+        self.minutes = self._parse_field(fields[0], 0, 59)
+        self.hours = self._parse_field(fields[1], 0, 23)
+        self.days = self._parse_field(fields[2], 1, 31)
+        self.months = self._parse_field(fields[3], 1, 12)
+        # cron counts days of week from Sunday, datetime.weekday() from Monday
+        self.weekdays = frozenset((weekday - 1) % 7 for weekday in self._parse_field(fields[4], 0, 7))
+        # like Vixie cron, a field starting with an asterisk, e.g. */2, does not restrict days
+        self._any_day = fields[2].startswith('*')
+        self._any_weekday = fields[4].startswith('*')
+
+    @staticmethod
+    def _parse_field(field: str, min_value: int, max_value: int) -> typing.Tuple[int, ...]:
+        values = set()
+        for part in field.split(','):
+            value_range, _, step = part.partition('/')
+            if value_range == '*':
+                start, end = min_value, max_value
+            elif '-' in value_range:
+                start, end = map(int, value_range.split('-'))
+            else:
+                start = end = int(value_range)
+                if step:
+                    end = max_value
+            step = int(step) if step else 1
+            if not min_value <= start <= end <= max_value or step < 1:
+                raise ValueError(f'wrong cron field "{field}"')
+            values.update(range(start, end + 1, step))
+        return tuple(sorted(values))
+
+    def _is_day_matched(self, day: datetime) -> bool:
+        day_matched = day.day in self.days
+        weekday_matched = day.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_matched and weekday_matched
+        return day_matched or weekday_matched
+
+    def get_next(self, dt: datetime) -> typing.Optional[datetime]:
+        tzinfo = dt.tzinfo
+        cursor = dt.replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        # no expression needs more than several years to match, e.g. February 29
+        for _ in range(8 * 12):
+            i = bisect.bisect_left(self.months, cursor.month)
+            if i == len(self.months):
+                cursor = datetime(cursor.year + 1, self.months[0], 1)
+                continue
+            if self.months[i] != cursor.month:
+                cursor = datetime(cursor.year, self.months[i], 1)
+            day = cursor
+            while day.month == cursor.month:
+                if self._is_day_matched(day):
+                    time = self._get_time(day, day.hour, day.minute)
+                    if time:
+                        return localize(time, tzinfo)
+                day = datetime(day.year, day.month, day.day) + timedelta(days=1)
+            cursor = day
+        return None
+
+    def _get_time(self, day: datetime, hour: int, minute: int) -> typing.Optional[datetime]:
+        i = bisect.bisect_left(self.hours, hour)
+        if i == len(self.hours):
+            return None
+        if self.hours[i] != hour:
+            return day.replace(hour=self.hours[i], minute=self.minutes[0])
+        j = bisect.bisect_left(self.minutes, minute)
+        if j < len(self.minutes):
+            return day.replace(minute=self.minutes[j])
+        if i + 1 < len(self.hours):
+            return day.replace(hour=self.hours[i + 1], minute=self.minutes[0])
+        return None
+
+
+class NotificationRule:
+    """
+    Compiled ``notification_settings`` of a project action.
+
+    Every timing is either a dict of ``relativedelta`` arguments applied to the current moment
+    or a cron expression string. The earliest moment strictly after the given one wins.
+    Timings are applied to the wall clock time, so they keep the local hour across DST changes.
+    """
+
+    __slots__ = ('_time_shifts', '_deltas', '_crons')
+
+    # timings with only these arguments are applied as datetime.replace() followed by a timedelta,
+    # which is exactly what relativedelta does for them, only several times faster
+    _time_fields = frozenset(['hour', 'minute', 'second', 'microsecond'])
+    _timedelta_fields = frozenset(['weeks', 'days', 'hours', 'minutes', 'seconds', 'microseconds'])
+
+    def __init__(self, timings: typing.Iterable[typing.Union[dict, str]]):
+        time_shifts = []
+        deltas = []
+        crons = []
+        for timing in timings:
+            if isinstance(timing, str):
+                crons.append(CronExpression(timing))
+            elif timing.keys() <= self._time_fields | self._timedelta_fields:
+                relativedelta(**timing)  # validates values the same way
+                time_shifts.append((
+                    {key: value for key, value in timing.items() if key in self._time_fields},
+                    timedelta(**{key: value for key, value in timing.items() if key in self._timedelta_fields}),
+                ))
+            else:
+                deltas.append(relativedelta(**timing))
+        self._time_shifts = tuple(time_shifts)
+        self._deltas = tuple(deltas)
+        self._crons = tuple(crons)
+
+    def get_next(self, dt: datetime) -> typing.Optional[datetime]:
+        tzinfo = dt.tzinfo
+        dt = dt.replace(tzinfo=None)
+        next_dt = None
+        for time_fields, shift in self._time_shifts:
+            possible_time = dt.replace(**time_fields) + shift
+            if possible_time > dt and (next_dt is None or possible_time < next_dt):
+                next_dt = possible_time
+        for delta in self._deltas:
+            possible_time = dt + delta
+            if possible_time > dt and (next_dt is None or possible_time < next_dt):
+                next_dt = possible_time
+        for cron in self._crons:
+            possible_time = cron.get_next(dt)
+            if possible_time is not None and (next_dt is None or possible_time < next_dt):
+                next_dt = possible_time
+        if next_dt is None or tzinfo is None:
+            return next_dt
+        if hasattr(tzinfo, 'normalize'):
+            # the offset of the current moment is right unless a DST transition lies in between
+            possible_time = tzinfo.normalize(next_dt.replace(tzinfo=tzinfo))
+            if possible_time.replace(tzinfo=None) == next_dt:
+                return possible_time
+        return localize(next_dt, tzinfo)
+
+
+_rules_cache = collections.OrderedDict()
+RULES_CACHE_SIZE = 4096
+
+
+def get_notification_rule(project_id: int, action_name: str, timings) -> NotificationRule:
+    """
+    Returns the compiled rule for the project action, compiling it again only when settings change
+    """
+    # settings come from a JSON column, so their representation is stable between loads
+    cache_key = (project_id, action_name, repr(timings))
+    rule = _rules_cache.get(cache_key)
+    if rule is None:
+        rule = _rules_cache[cache_key] = NotificationRule(timings)
+        if len(_rules_cache) > RULES_CACHE_SIZE:
+            _rules_cache.popitem(last=False)
+    else:
+        _rules_cache.move_to_end(cache_key)
+    return rule
@@ -0,0 +1,338 @@
+import asyncio
+import collections
+import enum
+import io
+import tempfile
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from aiogram.utils.emoji import emojize
+from aiogram.utils.markdown import text
+from dateutil.relativedelta import relativedelta, WE
+from auxy.utils import PeriodBucket, YearlyBucket, ItemStatus
+
+
+class ReportEntry(typing.NamedTuple):
+    period: str
+    text: str
+    notes: typing.Tuple[str, ...]
+
+
+class BucketStats(typing.NamedTuple):
+    period_bucket_key: str
+    active: int
+    done: int
+    rejected: int
+    notes: int
+
+
+def get_report_entries(items_lists) -> typing.List[ReportEntry]:
+    """
+    Copies loaded items lists to plain data, so the report can be rendered outside of the event loop
+    """
+    entries = []
+    for items_list in items_lists:
+        period = str(PeriodBucket.get_by_key(items_list.period_bucket_key))
+        for item in items_list.items:
+            entries.append(ReportEntry(period, item.text, tuple(note.text for note in item.notes)))
+    return entries
+
+
+def get_report_stats(items_lists) -> typing.List[BucketStats]:
+    """
+    Counts already loaded items the same way ``Project.get_range_stats`` does in the database
+    """
+    stats = []
+    for items_list in items_lists:
+        statuses = collections.Counter(item.status for item in items_list.items)
+        stats.append(BucketStats(
+            items_list.period_bucket_key,
+            statuses[ItemStatus.active],
+            statuses[ItemStatus.done],
+            statuses[ItemStatus.rejected],
+            sum(len(item.notes) for item in items_list.items),
+        ))
+    return stats
+
+
+def has_items(stats) -> bool:
+    return any(bucket_stats.active or bucket_stats.done or bucket_stats.rejected for bucket_stats in stats)
+
+
+def get_report_size(entries: typing.List[ReportEntry]) -> int:
+    return sum(1 + len(entry.notes) for entry in entries)
+
+
+class ReportPeriods(enum.Enum):
+    week = 1
+    month = 2
+    quarter = 3
+    year = 4
+
+
+def get_report_period(period: ReportPeriods, now: datetime) -> typing.Tuple[datetime, datetime]:
+    """
+    Returns the first and the last day of the period containing ``now``, weeks start on Wednesday
+    """
+    day_start = now + relativedelta(hour=0, minute=0, second=0, microsecond=0)
+    if period == ReportPeriods.week:
+        start_dt = day_start + relativedelta(weekday=WE(-1))
+        return start_dt, start_dt + relativedelta(days=6)
+    if period == ReportPeriods.month:
+        start_dt = day_start + relativedelta(day=1)
+        return start_dt, start_dt + relativedelta(months=1, days=-1)
+    if period == ReportPeriods.quarter:
+        start_dt = day_start + relativedelta(month=(now.month - 1) // 3 * 3 + 1, day=1)
+        return start_dt, start_dt + relativedelta(months=3, days=-1)
+    start_dt = day_start + relativedelta(month=1, day=1)
+    return start_dt, start_dt + relativedelta(years=1, days=-1)
+
+
+class ReportCalendar:
+    """
+    Calendar of whole weeks around the report period with a cell per day.
+
+    Cells are indexed by the number of days since the first Monday, so marking a day is O(1)
+    and the whole calendar is O(days) for any period.
+    """
+
+    def __init__(self, start: date, end: date):
+        self.start = start
+        self.end = end
+        self.first_day = start - timedelta(days=start.weekday())
+        days_num = (end - self.first_day).days + 7 - end.weekday()
+        self._cells = []
+        for i in range(days_num):
+            day = self.first_day + timedelta(days=i)
+            if day < start or day > end:
+                self._cells.append(':minus:')
+            elif day.weekday() < 5:
+                self._cells.append(':white_circle:')
+            else:
+                self._cells.append(':black_circle:')
+
+    def _get_index(self, day: date) -> typing.Optional[int]:
+        if self.start <= day <= self.end:
+            return (day - self.first_day).days
+        return None
+
+    def mark_planned(self, day: date):
+        i = self._get_index(day)
+        if i is not None:
+            self._cells[i] = self._cells[i].replace('white', 'purple')
+
+    def mark_today(self, day: date):
+        i = self._get_index(day)
+        if i is not None:
+            cell = self._cells[i]
+            if 'white' in cell or 'black' in cell:
+                self._cells[i] = cell.replace('circle', 'large_square')
+            else:
+                self._cells[i] = cell.replace('circle', 'square')
+
+    def get_weeks(self) -> typing.List[str]:
+        return [text(*self._cells[i:i + 7], sep='') for i in range(0, len(self._cells), 7)]
+
+
+def iter_report_lines(entries: typing.Iterable[ReportEntry], continued=False) -> typing.Iterator[str]:
+    """
+    Yields emojized lines of the report document, every line but the first starts with a line break.
+    A ``continued`` document starts with a line break too.
+    """
+    separator = '\n' if continued else ''
+    for entry in entries:
+        yield separator + emojize(text(':spiral_calendar_pad:', entry.period, ':pushpin:', entry.text))
+        separator = '\n'
+        for note in entry.notes:
+            yield separator + emojize(text(':paperclip:', note))
+        yield separator
+
+
+def render_caption(start_dt: datetime, end_dt: datetime, today: date, stats) -> str:
+    """
+    Builds the caption with the summary and the calendar from per-bucket statistics only
+    """
+    calendar = ReportCalendar(start_dt.date(), end_dt.date())
+    for bucket_stats in stats:
+        bucket_start = PeriodBucket.get_by_key(bucket_stats.period_bucket_key).start()
+        if bucket_start:
+            calendar.mark_planned(bucket_start.date())
+    calendar.mark_today(today)
+
+    if has_items(stats):
+        summary = [
+            text(f'Отчет о проделанной работе с {start_dt.date()} по {end_dt.date()}'),
+            text(
+                f'Выполнено: {sum(bucket_stats.done for bucket_stats in stats)},',
+                f'отклонено: {sum(bucket_stats.rejected for bucket_stats in stats)},',
+                f'в работе: {sum(bucket_stats.active for bucket_stats in stats)},',
+                f'заметок: {sum(bucket_stats.notes for bucket_stats in stats)}',
+            ),
+        ]
+    else:
+        summary = [
+            text(f'В период с {start_dt.date()} по {end_dt.date()} получается пустой отчет о проделанной работе'),
+        ]
+    return emojize(text(
+        *summary,
+        text(''),
+        text('Пн Вт Ср Чт Пт Сб Вс'),
+        *calendar.get_weeks(),
+        sep='\n'
+    ))
+
+
+def render_status_report(start_dt: datetime, end_dt: datetime, today: date, stats,
+                         entries: typing.List[ReportEntry]) -> typing.Tuple[str, str]:
+    """
+    Returns the emojized caption with the calendar and the report document, the document is empty
+    when nothing has been planned
+    """
+    return render_caption(start_dt, end_dt, today, stats), ''.join(iter_report_lines(entries))
+
+
+def get_stats_group(period_bucket_key) -> typing.Optional[str]:
+    """
+    Yearly buckets are grouped by years, shorter ones by months of their start, perpetual ones are not grouped
+    """
+    period_bucket = PeriodBucket.get_by_key(period_bucket_key)
+    start = period_bucket.start()
+    if start is None:
+        return None
+    if isinstance(period_bucket, YearlyBucket):
+        return str(start.year)
+    return f'{start.year}-{start.month:02d}'
+
+
+def render_stats_line(stats) -> str:
+    items_num = sum(bucket_stats.active + bucket_stats.done + bucket_stats.rejected for bucket_stats in stats)
+    done_num = sum(bucket_stats.done for bucket_stats in stats)
+    rejected_num = sum(bucket_stats.rejected for bucket_stats in stats)
+    notes_num = sum(bucket_stats.notes for bucket_stats in stats)
+    line = [f'периодов {len(stats)}, пунктов {items_num} ({items_num / len(stats):.1f} за период)']
+    if items_num:
+        line.append(f'выполнено {done_num * 100 // items_num}%, отклонено {rejected_num * 100 // items_num}%')
+    line.append(f'заметок {notes_num}')
+    return ', '.join(line)
+
+
+def render_project_stats(stats, max_groups=12) -> str:
+    """
+    Summarizes per-bucket statistics of the whole history and of the last ``max_groups`` months or years
+    """
+    if not stats:
+        return 'Пока нечего подсчитывать, в проекте еще ничего не запланировано'
+    groups = collections.defaultdict(list)
+    for bucket_stats in stats:
+        group = get_stats_group(bucket_stats.period_bucket_key)
+        if group is not None:
+            groups[group].append(bucket_stats)
+    lines = [
+        text('Статистика за все время:'),
+        text(render_stats_line(stats)),
+    ]
+    if groups:
+        lines.append(text(''))
+        for group in sorted(groups)[-max_groups:]:
+            lines.append(text(f'{group}:', render_stats_line(groups[group])))
+    return text(*lines, sep='\n')
+
+
+class ReportCache:
+    """
+    LRU cache of rendered reports. A report is returned only for the data version
+    of the project it has been rendered for, so writes invalidate it without any bookkeeping.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._reports = collections.OrderedDict()
+
+    def get(self, key, data_version) -> typing.Optional[typing.Tuple[str, bytes]]:
+        cached = self._reports.get(key)
+        if cached is None:
+            return None
+        if cached[0] != data_version:
+            del self._reports[key]
+            return None
+        self._reports.move_to_end(key)
+        return cached[1]
+
+    def put(self, key, data_version, caption: str, document: bytes):
+        self._reports[key] = (data_version, (caption, document))
+        self._reports.move_to_end(key)
+        if len(self._reports) > self.max_size:
+            self._reports.popitem(last=False)
+
+
+class SpooledReportFile(tempfile.SpooledTemporaryFile):
+    """
+    Keeps small reports in memory and rolls big ones over to disk
+    """
+
+
+# SpooledTemporaryFile is an io.IOBase only since Python 3.11, while aiogram uploads only those
+io.IOBase.register(SpooledReportFile)
+
+
+def write_status_report(start_dt: datetime, end_dt: datetime, today: date, stats,
+                        entries: typing.List[ReportEntry], file: typing.BinaryIO) -> typing.Tuple[str, int]:
+    """
+    Writes the report document to the binary file in UTF-8 line by line
+    and returns the caption along with the number of bytes written
+    """
+    size = write_report_lines(entries, file)
+    file.seek(0)
+    return render_caption(start_dt, end_dt, today, stats), size
+
+
+def write_report_lines(entries: typing.List[ReportEntry], file: typing.BinaryIO, continued=False) -> int:
+    size = 0
+    for line in iter_report_lines(entries, continued):
+        size += file.write(line.encode('utf-8'))
+    return size
+
+
+async def write_status_report_pages(start_dt, end_dt, today, stats,
+                                    pages: typing.AsyncIterable[typing.List[ReportEntry]], file,
+                                    executor=None, offload_threshold=0) -> typing.Tuple[str, int]:
+    """
+    Writes the report document page by page as pages of entries arrive, so only one page is kept in memory.
+    Big pages are written in the executor, like big reports by ``render_status_report_async``.
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        # files can not be passed to another process, the default thread pool still keeps the event loop free
+        executor = None
+        offloaded = True
+    else:
+        offloaded = executor is not None
+    loop = asyncio.get_event_loop()
+    size = 0
+    async for entries in pages:
+        if offloaded and get_report_size(entries) >= offload_threshold:
+            size += await loop.run_in_executor(executor, write_report_lines, entries, file, size > 0)
+        else:
+            size += write_report_lines(entries, file, size > 0)
+    file.seek(0)
+    return render_caption(start_dt, end_dt, today, stats), size
+
+
+async def render_status_report_async(start_dt, end_dt, today, stats, entries, file=None, executor=None,
+                                     offload_threshold=0):
+    """
+    Renders big reports in the executor to keep the event loop responsive,
+    small ones are cheaper to render in place.
+
+    With ``file`` the document is written there and its size is returned instead of the document.
+    """
+    if file is None:
+        render, args = render_status_report, (start_dt, end_dt, today, stats, entries)
+    else:
+        render, args = write_status_report, (start_dt, end_dt, today, stats, entries, file)
+    if executor is None or get_report_size(entries) < offload_threshold:
+        return render(*args)
+    if file is not None and isinstance(executor, ProcessPoolExecutor):
+        # files can not be passed to another process, the default thread pool still keeps the event loop free
+        executor = None
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, render, *args)
@@ -0,0 +1,115 @@
+import asyncio
+import enum
+import heapq
+import itertools
+from datetime import datetime, timedelta
+
+
+class MisfirePolicy(enum.Enum):
+    fire_late = 1
+    coalesce = 2
+    skip = 3
+
+
+def resolve_misfire(policy: MisfirePolicy, fire_at: datetime, now: datetime, grace: timedelta):
+    """
+    Returns the moment to run a due notification for (None to skip it)
+    and the moment to compute its next fire time from
+    """
+    if now - fire_at <= grace or policy == MisfirePolicy.coalesce:
+        return now, now
+    if policy == MisfirePolicy.skip:
+        return None, now
+    return fire_at, fire_at
+
+
+class NotificationScheduler:
+    """
+    Priority queue of (fire_at, project_id, action_name) entries.
+
+    Replaced and removed entries are only marked as cancelled and are discarded lazily
+    when they reach the top of the heap, so every operation stays O(log n).
+    Only entries due before ``window_end`` are kept in memory, the rest are loaded
+    from the database when the window moves forward.
+    """
+
+    def __init__(self, horizon: timedelta = timedelta(hours=1)):
+        self.horizon = horizon
+        self.window_end = None
+        self._queue = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._wakeup_event = None
+
+    @property
+    def _wakeup(self) -> asyncio.Event:
+        # created lazily to bind the event to the running loop
+        if self._wakeup_event is None:
+            self._wakeup_event = asyncio.Event()
+        return self._wakeup_event
+
+    def __len__(self):
+        return len(self._entries)
+
+    def move_window(self, now: datetime) -> datetime:
+        self.window_end = now + self.horizon
+        return self.window_end
+
+    def is_window_expired(self, now: datetime) -> bool:
+        return self.window_end is None or now >= self.window_end
+
+    def schedule(self, project_id: int, action_name: str, fire_at: datetime):
+        self.unschedule(project_id, action_name)
+        if self.window_end is not None and fire_at > self.window_end:
+            return
+        entry = [fire_at, next(self._counter), project_id, action_name, False]
+        self._entries[(project_id, action_name)] = entry
+        heapq.heappush(self._queue, entry)
+        if self._queue[0] is entry:
+            self._wakeup.set()
+
+    def unschedule(self, project_id: int, action_name: str = None):
+        if action_name is None:
+            keys = [key for key in self._entries if key[0] == project_id]
+        else:
+            keys = [(project_id, action_name)]
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                entry[-1] = True
+
+    def get_fire_time(self, project_id: int, action_name: str):
+        entry = self._entries.get((project_id, action_name))
+        return entry[0] if entry else None
+
+    def next_fire_at(self):
+        while self._queue and self._queue[0][-1]:
+            heapq.heappop(self._queue)
+        return self._queue[0][0] if self._queue else None
+
+    def pop_due(self, now: datetime):
+        due = []
+        while True:
+            fire_at = self.next_fire_at()
+            if fire_at is None or fire_at > now:
+                break
+            fire_at, _, project_id, action_name, _ = heapq.heappop(self._queue)
+            del self._entries[(project_id, action_name)]
+            due.append((fire_at, project_id, action_name))
+        return due
+
+    async def wait(self, now: datetime):
+        """
+        Sleeps until the earliest entry is due, an earlier entry has been scheduled
+        or the window is over
+        """
+        self._wakeup.clear()
+        wake_up_at = self.window_end if self.window_end is not None else now + self.horizon
+        fire_at = self.next_fire_at()
+        if fire_at is not None:
+            wake_up_at = min(fire_at, wake_up_at)
+        timeout = max((wake_up_at - now).total_seconds(), 0)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
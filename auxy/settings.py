@@ -1,4 +1,5 @@
 import os
+import socket
 
 WHITELISTED_USERS = list(map(int, os.environ['AUXY_WHITELISTED_USERS'].split(',')))
 WHITELISTED_CHATS = list(map(int, os.environ['AUXY_WHITELISTED_CHATS'].split(',')))
@@ -6,3 +7,39 @@ WHITELISTED_CHATS = list(map(int, os.environ['AUXY_WHITELISTED_CHATS'].split(','
 TELEGRAM_BOT_API_TOKEN = os.environ['AUXY_TELEGRAM_BOT_API_TOKEN']
 
 DATABASE_URI = os.environ['AUXY_DATABASE_URI']
+
+NOTIFICATION_CONCURRENCY = int(os.environ.get('AUXY_NOTIFICATION_CONCURRENCY', 16))
+TELEGRAM_GLOBAL_RATE_LIMIT = float(os.environ.get('AUXY_TELEGRAM_GLOBAL_RATE_LIMIT', 30))
+TELEGRAM_CHAT_RATE_LIMIT = float(os.environ.get('AUXY_TELEGRAM_CHAT_RATE_LIMIT', 1))
+NOTIFICATION_SCHEDULE_HORIZON = int(os.environ.get('AUXY_NOTIFICATION_SCHEDULE_HORIZON', 600))
+NOTIFICATION_MISFIRE_POLICY = os.environ.get('AUXY_NOTIFICATION_MISFIRE_POLICY', 'fire_late')
+NOTIFICATION_MISFIRE_GRACE = int(os.environ.get('AUXY_NOTIFICATION_MISFIRE_GRACE', 60))
+NOTIFICATION_LEASE_TIMEOUT = int(os.environ.get('AUXY_NOTIFICATION_LEASE_TIMEOUT', 300))
+NOTIFICATION_CLAIM_BATCH = int(os.environ.get('AUXY_NOTIFICATION_CLAIM_BATCH', 100))
+
+REPLICA_ID = os.environ.get('AUXY_REPLICA_ID') or '{}-{}'.format(socket.gethostname(), os.getpid())
+
+OUTBOX_BATCH = int(os.environ.get('AUXY_OUTBOX_BATCH', 100))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('AUXY_OUTBOX_POLL_INTERVAL', 1))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('AUXY_OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_RETRY_DELAY = float(os.environ.get('AUXY_OUTBOX_RETRY_DELAY', 5))
+OUTBOX_MAX_RETRY_DELAY = float(os.environ.get('AUXY_OUTBOX_MAX_RETRY_DELAY', 3600))
+OUTBOX_LEASE_TIMEOUT = int(os.environ.get('AUXY_OUTBOX_LEASE_TIMEOUT', 300))
+
+REPORT_RENDER_EXECUTOR = os.environ.get('AUXY_REPORT_RENDER_EXECUTOR', 'thread')
+REPORT_RENDER_WORKERS = int(os.environ.get('AUXY_REPORT_RENDER_WORKERS', 2))
+REPORT_RENDER_OFFLOAD_THRESHOLD = int(os.environ.get('AUXY_REPORT_RENDER_OFFLOAD_THRESHOLD', 200))
+REPORT_SPOOL_MAX_SIZE = int(os.environ.get('AUXY_REPORT_SPOOL_MAX_SIZE', 1024 * 1024))
+REPORT_CACHE_SIZE = int(os.environ.get('AUXY_REPORT_CACHE_SIZE', 256))
+REPORT_CACHE_MAX_DOCUMENT_SIZE = int(os.environ.get('AUXY_REPORT_CACHE_MAX_DOCUMENT_SIZE', 256 * 1024))
+REPORT_PAGE_SIZE = int(os.environ.get('AUXY_REPORT_PAGE_SIZE', 100))
+IMPORT_PROGRESS_ROWS = int(os.environ.get('AUXY_IMPORT_PROGRESS_ROWS', 10000))
+PROJECT_CACHE_SIZE = int(os.environ.get('AUXY_PROJECT_CACHE_SIZE', 1024))
+PROJECT_CACHE_TTL = float(os.environ.get('AUXY_PROJECT_CACHE_TTL', 300))
+PROJECT_CACHE_NEGATIVE_TTL = float(os.environ.get('AUXY_PROJECT_CACHE_NEGATIVE_TTL', 30))
+USER_CACHE_SIZE = int(os.environ.get('AUXY_USER_CACHE_SIZE', 1024))
+USER_CACHE_TTL = float(os.environ.get('AUXY_USER_CACHE_TTL', 3600))
+CHAT_CACHE_SIZE = int(os.environ.get('AUXY_CHAT_CACHE_SIZE', 1024))
+CHAT_CACHE_TTL = float(os.environ.get('AUXY_CHAT_CACHE_TTL', 3600))
+CACHE_STATS_LOG_INTERVAL = float(os.environ.get('AUXY_CACHE_STATS_LOG_INTERVAL', 3600))
+BUCKET_STATS_RECOUNT_INTERVAL = float(os.environ.get('AUXY_BUCKET_STATS_RECOUNT_INTERVAL', 24 * 3600))
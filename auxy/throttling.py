@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from aiogram.utils.exceptions import RetryAfter
+
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity else max(rate, 1)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._paused_until = 0
+        self._lock = None
+
+    def _refill(self):
+        now = self._clock()
+        if now > self._updated_at:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+        return now
+
+    def get_delay(self) -> float:
+        """
+        Takes a token if it is available, otherwise returns seconds to wait for it
+        """
+        now = self._refill()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._updated_at = self._paused_until
+        self._tokens = 0
+
+    def is_idle(self) -> bool:
+        now = self._refill()
+        return now >= self._paused_until and self._tokens >= self.capacity
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # the lock keeps waiters in FIFO order
+        async with self._lock:
+            delay = self.get_delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self.get_delay()
+
+
+class TelegramThrottler:
+    """
+    Limits outgoing Telegram API calls with a global and a per-chat token bucket.
+
+    Flood control errors pause only the bucket of the affected chat.
+    """
+
+    max_retries = 3
+    max_idle_chats = 1024
+
+    def __init__(self, global_rate: float, chat_rate: float):
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_rate = chat_rate
+        self._chat_buckets = {}
+
+    def _get_chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_idle_chats:
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if not value.is_idle()
+                }
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self._chat_rate)
+        return bucket
+
+    async def call(self, chat_id, request_factory):
+        """
+        Awaits ``request_factory()`` respecting rate limits for ``chat_id``.
+
+        The factory is called once per attempt, so it has to build a fresh request
+        (e.g. reopen a document) every time.
+        """
+        chat_bucket = self._get_chat_bucket(chat_id)
+        attempt = 0
+        while True:
+            await chat_bucket.acquire()
+            await self._global_bucket.acquire()
+            try:
+                return await request_factory()
+            except RetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                log.warning('Flood control for chat %s, retrying in %s seconds', chat_id, e.timeout)
+                chat_bucket.pause(e.timeout)
@@ -0,0 +1,62 @@
+import functools
+import typing
+from collections import defaultdict
+from datetime import datetime
+import pytz
+
+
+DEFAULT_TIMEZONE = 'Asia/Novosibirsk'
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name: str):
+    return pytz.timezone(name)
+
+
+def is_valid_timezone(name) -> bool:
+    if not isinstance(name, str):
+        return False
+    try:
+        get_timezone(name)
+    except pytz.UnknownTimeZoneError:
+        return False
+    return True
+
+
+def localize(dt: datetime, tzinfo) -> datetime:
+    """
+    Attaches the timezone to a wall clock time, pytz timezones have to pick the UTC offset themselves
+    """
+    if tzinfo is None:
+        return dt
+    if hasattr(tzinfo, 'localize'):
+        return tzinfo.localize(dt)
+    return dt.replace(tzinfo=tzinfo)
+
+
+def to_local_times(due) -> typing.List[typing.Tuple[typing.Any, datetime]]:
+    """
+    Converts every (project, moment) pair to the local time of the project.
+    Projects share the moment most of the time, so it is converted once per timezone.
+    """
+    local_times = {}
+    converted = []
+    for project, dt in due:
+        key = (dt, project.timezone)
+        local_dt = local_times.get(key)
+        if local_dt is None:
+            local_dt = local_times[key] = dt.astimezone(get_timezone(project.timezone))
+        converted.append((project, local_dt))
+    return converted
+
+
+def group_by_wall_time(due) -> typing.Dict[datetime, list]:
+    """
+    Groups (project, local moment) pairs by the wall clock time, so everything depending
+    only on local time, e.g. day boundaries, is computed once for all projects
+    having the same UTC offset at that moment
+    """
+    groups = defaultdict(list)
+    for project, local_dt in due:
+        groups[local_dt.replace(tzinfo=None)].append(project)
+    return groups
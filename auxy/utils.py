@@ -1,9 +1,10 @@
 import enum
+import functools
+import re
 import typing
 from abc import abstractmethod
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 from aiogram import types
-from dateutil.relativedelta import relativedelta, MO
 
 
 class ItemStatus(enum.Enum):
@@ -12,6 +13,12 @@ class ItemStatus(enum.Enum):
     rejected = 3
 
 
+class OutboxMessageStatus(enum.Enum):
+    pending = 1
+    sent = 2
+    failed = 3
+
+
 def get_bulleted_items_list_from_message(message: types.Message):
     items = []
     for message_line in message['text'].split('\n'):
@@ -20,43 +27,53 @@ def get_bulleted_items_list_from_message(message: types.Message):
     return items
 
 
-def generate_grid(start_dt, end_dt):
-    grid = []
-    dt_cursor = start_dt + relativedelta(weekday=MO(-1))
-    while dt_cursor < end_dt:
-        days_b = (start_dt - dt_cursor).days
-        days_a = (end_dt - dt_cursor).days + 1
-        grid.append(
-            list(zip(
-                [':minus:'] * days_b +
-                [':white_circle:'] * (min(5, days_a) - max(days_b, 0)) +
-                [':black_circle:'] * min(2, days_a - 5, max(0, 7 - days_b)) +
-                [':minus:'] * (7 - days_a)
-                ,
-                [dt_cursor+relativedelta(days=i) for i in range(7)]
-            ))
-        )
-        dt_cursor += relativedelta(weeks=1, weekday=MO(-1))
-    return grid
+BUCKETS_CACHE_SIZE = 4096
+
+
+def _get_day_start(ordinal: int, tzinfo) -> datetime:
+    return datetime.combine(date.fromordinal(ordinal), time(), tzinfo)
 
 
 class PeriodBucket:
+    """
+    Buckets are immutable and keep the timezone of the moment they have been built for.
+
+    Every bucket is backed by an integer ordinal of its period, so moving between buckets
+    is integer arithmetic and datetimes are built only when asked for.
+    """
+
+    __slots__ = ('_ordinal', '_tzinfo')
 
     @classmethod
-    def new(cls, mode: 'PeriodBucketModes', dt: datetime):
+    def new(cls, mode: 'PeriodBucketModes', dt: typing.Union[date, datetime]):
         return mode.value(dt)
 
     @classmethod
     def get_by_key(cls, period_bucket_key):
-        try:
-            if period_bucket_key == 'perpetual':
-                mode_name, key = period_bucket_key, ''
-            else:
-                mode_name, key = period_bucket_key.split('-', 1)
-            ConcreteBucket = bucket_classes[mode_name]
-            return ConcreteBucket(key)
-        except ValueError:
-            raise ValueError('wrong period bucket key')
+        """
+        Keys are zero-padded to keep their string order chronological, keys without padding are accepted too
+        """
+        return _get_bucket_by_key(period_bucket_key)
+
+    @staticmethod
+    def range(start_bucket: 'PeriodBucket', end_bucket: 'PeriodBucket') -> typing.Iterator['PeriodBucket']:
+        """
+        Lazily yields buckets from ``start_bucket`` to ``end_bucket`` of the same mode inclusive
+        """
+        bucket = start_bucket
+        while bucket._ordinal <= end_bucket._ordinal:
+            yield bucket
+            next_bucket = bucket.get_next()
+            if next_bucket is bucket:
+                break
+            bucket = next_bucket
+
+    @classmethod
+    def _from_ordinal(cls, ordinal: int, tzinfo):
+        bucket = cls.__new__(cls)
+        bucket._ordinal = ordinal
+        bucket._tzinfo = tzinfo
+        return bucket
 
     @abstractmethod
     def key(self):
@@ -81,125 +98,186 @@ class PeriodBucket:
         start = self.start()
         end = self.end()
         if start and end:
-            end_str = (end + relativedelta(days=-1)).date().isoformat()
+            end_str = (end - timedelta(days=1)).date().isoformat()
             return f'{start.date().isoformat()} / {end_str}'
         return ''
 
 
+@functools.lru_cache(maxsize=BUCKETS_CACHE_SIZE)
+def _get_bucket_by_key(period_bucket_key) -> PeriodBucket:
+    try:
+        if period_bucket_key == 'perpetual':
+            mode_name, key = period_bucket_key, ''
+        else:
+            mode_name, key = period_bucket_key.split('-', 1)
+        ConcreteBucket = bucket_classes[mode_name]
+        return ConcreteBucket(key)
+    except (ValueError, KeyError):
+        raise ValueError('wrong period bucket key')
+
+
 class DailyBucket(PeriodBucket):
+    """
+    Ordinal is the proleptic Gregorian ordinal of the day.
+    Buckets of plain dates, which notifications use, have naive bounds.
+    """
 
-    def __init__(self, dt: typing.Union[str, datetime]):
+    __slots__ = ()
+
+    def __init__(self, dt: typing.Union[str, date, datetime]):
         if isinstance(dt, str):
             try:
                 dt = datetime.fromisoformat(dt)
             except ValueError:
                 raise ValueError('wrong period bucket key')
-        self._day_start = dt + relativedelta(hour=0, minute=0, second=0, microsecond=0)
+        self._ordinal = dt.toordinal()
+        self._tzinfo = getattr(dt, 'tzinfo', None)
 
     def key(self) -> str:
-        return 'day-' + self._day_start.date().isoformat()
+        return 'day-' + date.fromordinal(self._ordinal).isoformat()
 
     def start(self) -> typing.Optional[datetime]:
-        return self._day_start
+        return _get_day_start(self._ordinal, self._tzinfo)
 
     def end(self) -> typing.Optional[datetime]:
-        return self._day_start + relativedelta(days=1)
+        return _get_day_start(self._ordinal + 1, self._tzinfo)
 
     def get_next(self) -> 'DailyBucket':
-        return DailyBucket(self._day_start + relativedelta(days=1))
+        return self._from_ordinal(self._ordinal + 1, self._tzinfo)
 
     def __str__(self):
-        return self._day_start.date().isoformat()
+        return date.fromordinal(self._ordinal).isoformat()
 
 
 class WorkingDaysBucket(DailyBucket):
 
+    __slots__ = ()
+
+    # the ordinal of a Sunday is divisible by 7, the one of a Saturday gives 6
+
     def is_valid(self):
-        return self._day_start.isoweekday() not in [6, 7]
+        return self._ordinal % 7 not in [6, 0]
 
     def get_next(self) -> 'WorkingDaysBucket':
-        new_day_start = self._day_start + relativedelta(days=1)
-        if new_day_start.isoweekday() in [6, 7]:
-            new_day_start += relativedelta(weekday=MO)
-        return WorkingDaysBucket(new_day_start)
+        ordinal = self._ordinal + 1
+        if ordinal % 7 == 6:
+            ordinal += 2
+        elif ordinal % 7 == 0:
+            ordinal += 1
+        return self._from_ordinal(ordinal, self._tzinfo)
 
 
 class WeeklyBucket(PeriodBucket):
+    """
+    Ordinal is the ordinal of the Monday starting the ISO week
+    """
+
+    __slots__ = ()
+
+    _key_re = re.compile(r'(\d{4})-(\d{1,2})')
 
-    def __init__(self, dt: typing.Union[str, datetime]):
+    def __init__(self, dt: typing.Union[str, date, datetime]):
         if isinstance(dt, str):
+            mo = self._key_re.fullmatch(dt)
+            if not mo or mo.group(2) == '00' or int(mo.group(2)) > 53:
+                raise ValueError('wrong period bucket key')
+            # the 4th of January is always in the first ISO week
             try:
-                year, week = dt.split('-')
-                dt = datetime.strptime(f'{year} {week} 1', '%G %V %u')
+                january_4 = date(int(mo.group(1)), 1, 4)
+                self._ordinal = january_4.toordinal() - january_4.weekday() + (int(mo.group(2)) - 1) * 7
+                date.fromordinal(self._ordinal)
             except ValueError:
                 raise ValueError('wrong period bucket key')
-        self._week_start = dt + relativedelta(weekday=MO(-1), hour=0, minute=0, second=0, microsecond=0)
+            self._tzinfo = None
+        else:
+            self._ordinal = dt.toordinal() - dt.weekday()
+            self._tzinfo = getattr(dt, 'tzinfo', None)
 
     def key(self) -> str:
-        year, week, _ = self._week_start.isocalendar()
-        return 'week-{}-{}'.format(year, week)
+        year, week, _ = date.fromordinal(self._ordinal).isocalendar()
+        return 'week-{}-{:02d}'.format(year, week)
 
     def start(self) -> typing.Optional[datetime]:
-        return self._week_start
+        return _get_day_start(self._ordinal, self._tzinfo)
 
     def end(self) -> typing.Optional[datetime]:
-        return self._week_start + relativedelta(weeks=1)
+        return _get_day_start(self._ordinal + 7, self._tzinfo)
 
     def get_next(self) -> 'WeeklyBucket':
-        return WeeklyBucket(self._week_start + relativedelta(weeks=1))
+        return self._from_ordinal(self._ordinal + 7, self._tzinfo)
 
 
 class MonthlyBucket(PeriodBucket):
+    """
+    Ordinal is the number of months since the beginning of the year 0
+    """
+
+    __slots__ = ()
 
-    def __init__(self, dt: typing.Union[str, datetime]):
+    def __init__(self, dt: typing.Union[str, date, datetime]):
         if isinstance(dt, str):
             try:
                 year, month = dt.split('-')
                 dt = datetime(int(year), int(month), 1)
             except ValueError:
                 raise ValueError('wrong period bucket key')
-        self._month_start = dt + relativedelta(day=1, hour=0, minute=0, second=0, microsecond=0)
+        self._ordinal = dt.year * 12 + dt.month - 1
+        self._tzinfo = getattr(dt, 'tzinfo', None)
+
+    def _get_month_start(self, ordinal: int) -> datetime:
+        year, month = divmod(ordinal, 12)
+        return datetime(year, month + 1, 1, tzinfo=self._tzinfo)
 
     def key(self) -> str:
-        return 'month-{}-{}'.format(self._month_start.year, self._month_start.month)
+        year, month = divmod(self._ordinal, 12)
+        return 'month-{}-{:02d}'.format(year, month + 1)
 
     def start(self) -> typing.Optional[datetime]:
-        return self._month_start
+        return self._get_month_start(self._ordinal)
 
     def end(self) -> typing.Optional[datetime]:
-        return self._month_start + relativedelta(months=1)
+        return self._get_month_start(self._ordinal + 1)
 
     def get_next(self) -> 'MonthlyBucket':
-        return MonthlyBucket(self._month_start + relativedelta(months=1))
+        return self._from_ordinal(self._ordinal + 1, self._tzinfo)
 
 
 class YearlyBucket(PeriodBucket):
+    """
+    Ordinal is the year
+    """
 
-    def __init__(self, dt: typing.Union[str, datetime]):
+    __slots__ = ()
+
+    def __init__(self, dt: typing.Union[str, date, datetime]):
         if isinstance(dt, str):
             try:
                 dt = datetime(int(dt), 1, 1)
             except ValueError:
                 raise ValueError('wrong period bucket key')
-        self._year_start = dt + relativedelta(day=1, month=1, hour=0, minute=0, second=0, microsecond=0)
+        self._ordinal = dt.year
+        self._tzinfo = getattr(dt, 'tzinfo', None)
 
     def key(self) -> str:
-        return 'year-{}'.format(self._year_start.year)
+        return 'year-{}'.format(self._ordinal)
 
     def start(self) -> typing.Optional[datetime]:
-        return self._year_start
+        return datetime(self._ordinal, 1, 1, tzinfo=self._tzinfo)
 
     def end(self) -> typing.Optional[datetime]:
-        return self._year_start + relativedelta(months=1)
+        return datetime(self._ordinal + 1, 1, 1, tzinfo=self._tzinfo)
 
     def get_next(self) -> 'YearlyBucket':
-        return YearlyBucket(self._year_start + relativedelta(months=1))
+        return self._from_ordinal(self._ordinal + 1, self._tzinfo)
 
 
 class PerpetualBucket(PeriodBucket):
 
-    def __init__(self, dt: typing.Union[str, datetime]):
-        pass
+    __slots__ = ()
+
+    def __init__(self, dt: typing.Union[str, date, datetime]):
+        self._ordinal = 0
+        self._tzinfo = None
 
     def key(self) -> str:
         return 'perpetual'
@@ -0,0 +1,91 @@
+"""
+Minimal benchmark harness storing results per commit, so hot paths can be compared between commits
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def get_revision() -> str:
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return revision + '-dirty' if dirty else revision
+
+
+def measure(case, number: int, repeat: int = 5) -> float:
+    """
+    Returns the best time of a single call in microseconds
+    """
+    return min(timeit.repeat(case, number=number, repeat=repeat)) / number * 1e6
+
+
+def get_results_path(revision: str) -> str:
+    return os.path.join(RESULTS_DIR, f'{revision}.json')
+
+
+def save_results(revision: str, results: dict) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = get_results_path(revision)
+    with open(path, 'w') as f:
+        json.dump({
+            'revision': revision,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent=4, sort_keys=True)
+    return path
+
+
+def load_results(revision: str) -> dict:
+    with open(get_results_path(revision)) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> list:
+    """
+    Returns names of cases which became slower than the baseline by more than ``threshold`` percent
+    """
+    regressions = []
+    for name, micros in results.items():
+        if name not in baseline:
+            continue
+        change = (micros / baseline[name] - 1) * 100
+        if change > threshold:
+            regressions.append(name)
+        print(f'{name:>48}: {baseline[name]:10.2f} -> {micros:10.2f} us ({change:+.1f}%)')
+    return regressions
+
+
+def main(cases: dict, argv=None):
+    """
+    Runs ``cases``, a dict mapping names to (callable, number of calls) pairs, from the command line
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-k', dest='keyword', default='', help='run only cases containing the keyword')
+    parser.add_argument('--save', action='store_true', help='store results as benchmarks/results/<revision>.json')
+    parser.add_argument('--compare', metavar='REVISION', help='compare with results stored for the revision')
+    parser.add_argument('--threshold', type=float, default=10, help='slowdown in percent treated as a regression')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, (case, number) in cases.items():
+        if args.keyword in name:
+            results[name] = measure(case, number)
+            print(f'{name:>48}: {results[name]:10.2f} us per call')
+    if args.save:
+        print('Saved to', save_results(get_revision(), results))
+    if args.compare:
+        regressions = compare(load_results(args.compare), results, args.threshold)
+        if regressions:
+            print('Slower than', args.compare, 'by more than', f'{args.threshold}%:', ', '.join(regressions))
+            sys.exit(1)
@@ -0,0 +1,117 @@
+"""
+Benchmarks of period buckets, report calendars, message parsing and report rendering
+
+    python -m benchmarks.hot_paths --save
+    python -m benchmarks.hot_paths --compare <revision>
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+import pytz
+from aiogram import types
+from auxy.utils import PeriodBucket, PeriodBucketModes, ItemStatus, get_bulleted_items_list_from_message
+from auxy.utils import _get_bucket_by_key
+from auxy.reports import ReportCalendar, ReportPeriods, SpooledReportFile, get_report_period, get_report_entries, \
+    get_report_stats, render_status_report, write_status_report
+from . import harness
+
+
+ItemsList = namedtuple('ItemsList', ['period_bucket_key', 'items'])
+Item = namedtuple('Item', ['text', 'status', 'notes'])
+Note = namedtuple('Note', ['text'])
+
+NOW = pytz.timezone('Asia/Novosibirsk').localize(datetime(2021, 6, 9, 18, 30))
+
+
+def get_items_lists(days_num: int, items_num: int, notes_num: int):
+    statuses = list(ItemStatus)
+    items_lists = []
+    for i in range(days_num):
+        bucket = PeriodBucket.new(PeriodBucketModes.daily, NOW - timedelta(days=i))
+        items_lists.append(ItemsList(bucket.key(), [
+            Item(f'item {i} {j} ' * 4, statuses[j % len(statuses)], [Note(f'note {k} ' * 8) for k in range(notes_num)])
+            for j in range(items_num)
+        ]))
+    return items_lists[::-1]
+
+
+def get_bucket_keys(mode: PeriodBucketModes, buckets_num: int):
+    bucket = PeriodBucket.new(mode, NOW)
+    keys = []
+    for _ in range(buckets_num):
+        keys.append(bucket.key())
+        bucket = bucket.get_next()
+    return keys
+
+
+def parse_keys_uncached(keys):
+    _get_bucket_by_key.cache_clear()
+    for key in keys:
+        PeriodBucket.get_by_key(key)
+
+
+def walk_buckets(mode: PeriodBucketModes, buckets_num: int):
+    bucket = PeriodBucket.new(mode, NOW)
+    for _ in range(buckets_num):
+        bucket = bucket.get_next()
+
+
+def build_calendar(period: ReportPeriods):
+    start_dt, end_dt = get_report_period(period, NOW)
+    calendar = ReportCalendar(start_dt.date(), end_dt.date())
+    day = start_dt.date()
+    while day <= end_dt.date():
+        calendar.mark_planned(day)
+        day += timedelta(days=2)
+    calendar.mark_today(NOW.date())
+    return calendar.get_weeks()
+
+
+def render_report(items_lists):
+    start_dt, end_dt = get_report_period(ReportPeriods.month, NOW)
+    return render_status_report(
+        start_dt, end_dt, NOW.date(), get_report_stats(items_lists), get_report_entries(items_lists)
+    )
+
+
+def write_report(items_lists):
+    start_dt, end_dt = get_report_period(ReportPeriods.month, NOW)
+    with SpooledReportFile(1024 * 1024) as report:
+        return write_status_report(
+            start_dt, end_dt, NOW.date(), get_report_stats(items_lists), get_report_entries(items_lists), report
+        )
+
+
+def get_cases():
+    day_keys = get_bucket_keys(PeriodBucketModes.daily, 365)
+    week_keys = get_bucket_keys(PeriodBucketModes.weekly, 52)
+    big_message = types.Message(text='\n'.join(
+        f'- item number {i}' if i % 3 else f'line without a bullet {i}' for i in range(2000)
+    ))
+    month_of_items = get_items_lists(30, 5, 2)
+    year_of_items = get_items_lists(365, 5, 2)
+    return {
+        'bucket new, daily': (lambda: PeriodBucket.new(PeriodBucketModes.daily, NOW), 20000),
+        'bucket new, weekly': (lambda: PeriodBucket.new(PeriodBucketModes.weekly, NOW), 20000),
+        'bucket new, monthly': (lambda: PeriodBucket.new(PeriodBucketModes.monthly, NOW), 20000),
+        'bucket get_by_key, cached': (lambda: PeriodBucket.get_by_key('week-2021-23'), 20000),
+        'bucket get_by_key, 365 days uncached': (lambda: parse_keys_uncached(day_keys), 20),
+        'bucket get_by_key, 52 weeks uncached': (lambda: parse_keys_uncached(week_keys), 100),
+        'bucket get_next, 365 days': (lambda: walk_buckets(PeriodBucketModes.daily, 365), 100),
+        'bucket get_next, 365 working days': (lambda: walk_buckets(PeriodBucketModes.onworkingdays, 365), 100),
+        'bucket get_next, 120 months': (lambda: walk_buckets(PeriodBucketModes.monthly, 120), 100),
+        'bucket range, 365 days': (lambda: list(PeriodBucket.range(
+            PeriodBucket.new(PeriodBucketModes.daily, NOW),
+            PeriodBucket.new(PeriodBucketModes.daily, NOW + timedelta(days=364)),
+        )), 100),
+        'calendar, week': (lambda: build_calendar(ReportPeriods.week), 2000),
+        'calendar, month': (lambda: build_calendar(ReportPeriods.month), 1000),
+        'calendar, year': (lambda: build_calendar(ReportPeriods.year), 100),
+        'bulleted items, 2000 lines': (lambda: get_bulleted_items_list_from_message(big_message), 100),
+        'report render, 30 days x 5 items': (lambda: render_report(month_of_items), 50),
+        'report render, 365 days x 5 items': (lambda: render_report(year_of_items), 5),
+        'report write to spooled file, 365 days': (lambda: write_report(year_of_items), 5),
+    }
+
+
+if __name__ == '__main__':
+    harness.main(get_cases())
@@ -0,0 +1,40 @@
+"""
+Compares compiled notification rules against the former per-tick computation
+
+    python -m benchmarks.notification_rules
+"""
+import timeit
+from datetime import datetime
+import pytz
+from dateutil.relativedelta import relativedelta
+from auxy.notification_rules import get_notification_rule
+
+
+TIMINGS = [
+    {'hour': 18, 'minute': 0, 'second': 0, 'microsecond': 0},
+    {'days': 1, 'hour': 18, 'minute': 0, 'second': 0, 'microsecond': 0},
+]
+
+
+def legacy_get_next_notification_time(now, timings):
+    possible_times = [now + relativedelta(**timing) for timing in timings]
+    possible_times = list(filter(lambda possible_time: possible_time > now, possible_times))
+    if len(possible_times) == 1:
+        return possible_times[0]
+    return min(*possible_times)
+
+
+def main(number=20000):
+    now = datetime.now(pytz.timezone('Asia/Novosibirsk'))
+    cases = {
+        'legacy': lambda: legacy_get_next_notification_time(now, TIMINGS),
+        'compiled': lambda: get_notification_rule(1, 'end_of_work_day', TIMINGS).get_next(now),
+        'compiled, cron': lambda: get_notification_rule(1, 'todo_for_today', ['0 9 * * 1-5']).get_next(now),
+    }
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=number, repeat=5))
+        print(f'{name:>16}: {seconds / number * 1e6:.2f} us per call')
+
+
+if __name__ == '__main__':
+    main()
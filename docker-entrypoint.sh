@@ -1,5 +1,5 @@
 #!/bin/bash
 
-# NB: For now three will be only one container instance and migrations never run concurrently
+# NB: Several containers may be started at once, migrations are serialized with an advisory lock in alembic env.py
 python -u -m alembic upgrade head
 python -u -m auxy.bot
@@ -0,0 +1,86 @@
+import asyncio
+import os
+from datetime import datetime
+import pytest
+import pytz
+from sqlalchemy import delete
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+
+TEST_DATABASE_URI = os.environ.get('AUXY_TEST_DATABASE_URI')
+USER_ID = CHAT_ID = -1002
+PERIOD_BUCKET_KEY = 'day-2021-01-01'
+
+
+async def clean_up(engine):
+    from auxy.db.models import User, Chat, Project, ItemsList, Item, BucketStats, item_in_list_table
+    async with AsyncSession(engine) as session:
+        project_ids = (await session.execute(select(Project.id).where(Project.owner_user_id == USER_ID))) \
+            .scalars().all()
+        item_ids = select(Item.id).where(Item.project_id.in_(project_ids))
+        await session.execute(delete(item_in_list_table).where(item_in_list_table.c.item_id.in_(item_ids)))
+        for model in (Item, ItemsList, BucketStats):
+            await session.execute(delete(model).where(model.project_id.in_(project_ids)))
+        await session.execute(delete(Project).where(Project.id.in_(project_ids)))
+        await session.execute(delete(Chat).where(Chat.id == CHAT_ID))
+        await session.execute(delete(User).where(User.id == USER_ID))
+        await session.commit()
+
+
+async def create_list(engine, items_num):
+    from auxy.db.models import User, Chat, Project, ItemsList, Item, BucketStats
+    from auxy.utils import PeriodBucketModes
+    now = datetime.now(pytz.utc)
+    async with AsyncSession(engine) as session:
+        session.add(User(id=USER_ID, joined_dt=now))
+        session.add(Chat(id=CHAT_ID, joined_dt=now))
+        project = Project(name='stats', owner_user_id=USER_ID, chat_id=CHAT_ID, created_dt=now,
+                          period_bucket_mode=PeriodBucketModes.daily, settings={})
+        items = [Item(text=str(i), created_dt=now) for i in range(items_num)]
+        session.add(project)
+        await session.flush()
+        for item in items:
+            item.project_id = project.id
+        session.add(ItemsList(project_id=project.id, created_dt=now, period_bucket_key=PERIOD_BUCKET_KEY,
+                              items=items))
+        await BucketStats.refresh(session, ItemsList.project_id == project.id)
+        ids = project.id, [item.id for item in items]
+        await session.commit()
+        return ids
+
+
+async def finish_item(engine, item_id, delay):
+    from auxy.db.models import Item, BucketStats
+    from auxy.utils import ItemStatus
+    async with AsyncSession(engine) as session:
+        item = await session.get(Item, item_id)
+        item.status = ItemStatus.done
+        await session.flush()
+        await asyncio.sleep(delay)
+        await BucketStats.refresh_for_item(session, item_id)
+        # the other recount runs meanwhile
+        await asyncio.sleep(0.2)
+        await session.commit()
+
+
+async def finish_items_concurrently():
+    # importing models configures the bot from the environment, which is only set up along with a test database
+    from auxy.db.models import BucketStats
+    engine = create_async_engine(TEST_DATABASE_URI)
+    try:
+        await clean_up(engine)
+        project_id, item_ids = await create_list(engine, 2)
+        await asyncio.gather(*(finish_item(engine, item_id, delay) for item_id, delay in zip(item_ids, (0, 0.1))))
+        async with AsyncSession(engine) as session:
+            stats = await session.get(BucketStats, (project_id, PERIOD_BUCKET_KEY))
+            counts = stats.active, stats.done
+        await clean_up(engine)
+    finally:
+        await engine.dispose()
+    return counts
+
+
+@pytest.mark.skipif(TEST_DATABASE_URI is None, reason='AUXY_TEST_DATABASE_URI is not set')
+def test_concurrent_refreshes_count_every_change():
+    assert asyncio.run(finish_items_concurrently()) == (0, 2)
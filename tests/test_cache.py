@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from auxy.cache import TTLCache, MISSING
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire():
+    clock = Clock()
+    cache = TTLCache(10, 60, clock=clock)
+    cache.put(1, 'project')
+    cache.put(2, None)
+    clock.now = 59
+    assert cache.get(1) == 'project'
+    assert cache.get(2) is None
+    assert cache.get(3) is MISSING
+    clock.now = 60
+    assert cache.get(1) is MISSING
+    assert len(cache) == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(2, 60, clock=Clock())
+    cache.put(1, 'a')
+    cache.put(2, 'b')
+    cache.get(1)
+    cache.put(3, 'c')
+    assert cache.get(2) is MISSING
+    assert cache.get(1) == 'a'
+    cache.invalidate(1)
+    assert cache.get(1) is MISSING
+
+
+def test_concurrent_misses_share_a_single_load():
+    cache = TTLCache(10, 60, clock=Clock())
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0)
+        return 'user'
+
+    async def get_many():
+        return await asyncio.gather(*(cache.get_or_load(1, load) for _ in range(5)))
+
+    assert asyncio.run(get_many()) == ['user'] * 5
+    assert len(loads) == 1
+    assert cache.get(1) == 'user'
+    assert cache.get_stats() == dict(size=1, hits=1, misses=5, loads=1)
+
+
+def test_failed_and_invalidated_loads_are_not_cached():
+    cache = TTLCache(10, 60, clock=Clock())
+
+    async def fail():
+        raise RuntimeError()
+
+    async def load_and_invalidate():
+        cache.invalidate(1)
+        return 'stale'
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_load(1, fail))
+    assert cache.get(1) is MISSING
+    assert asyncio.run(cache.get_or_load(1, load_and_invalidate)) == 'stale'
+    assert cache.get(1) is MISSING
+
+
+def test_nothing_found_expires_after_negative_ttl():
+    clock = Clock()
+    cache = TTLCache(10, 60, negative_ttl=5, clock=clock)
+    cache.put(1, None)
+    cache.put(2, 'project')
+    clock.now = 5
+    assert cache.get(1) is MISSING
+    assert cache.get(2) == 'project'
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from aiogram.utils.exceptions import BotBlocked, NetworkError, ChatNotFound
+from auxy.delivery import get_retry_delay, get_delivery_result
+from auxy.utils import OutboxMessageStatus
+
+
+NOW = datetime(2021, 6, 9, 18, 30)
+
+
+def deliver(attempts, error=None):
+    return get_delivery_result(attempts, error, NOW, max_attempts=3, retry_delay=5, max_retry_delay=60)
+
+
+def test_retry_delay_doubles_up_to_maximum():
+    assert [get_retry_delay(attempts, 5, 60) for attempts in range(1, 7)] == [5, 10, 20, 40, 60, 60]
+
+
+def test_delivered_message_is_sent():
+    values = deliver(1)
+    assert values['status'] == OutboxMessageStatus.sent
+    assert values['sent_dt'] == NOW
+    assert values['attempts'] == 1
+    assert values['locked_by'] is None and values['locked_until'] is None
+
+
+def test_transient_error_is_retried_later():
+    values = deliver(2, NetworkError('timeout'))
+    assert 'status' not in values
+    assert values['next_attempt_at'] == NOW + timedelta(seconds=10)
+    assert values['last_error'] == repr(NetworkError('timeout'))
+    assert values['locked_by'] is None and values['locked_until'] is None
+
+
+def test_message_fails_after_last_attempt():
+    values = deliver(3, NetworkError('timeout'))
+    assert values['status'] == OutboxMessageStatus.failed
+    assert 'next_attempt_at' not in values
+
+
+def test_permanent_errors_are_not_retried():
+    for error in (BotBlocked('Forbidden: bot was blocked by the user'), ChatNotFound('Chat not found')):
+        values = deliver(1, error)
+        assert values['status'] == OutboxMessageStatus.failed
+        assert values['last_error'] == str(error)
+        assert 'next_attempt_at' not in values
@@ -0,0 +1,38 @@
+import asyncio
+import io
+import json
+from datetime import datetime
+import pytz
+from auxy.exports import ExportFormats, get_export_format, write_jsonl
+
+
+class Row:
+
+    def __init__(self, **mapping):
+        self._mapping = mapping
+
+
+async def iter_rows(rows):
+    for row in rows:
+        yield row
+
+
+def test_export_format():
+    assert get_export_format('') == ExportFormats.csv
+    assert get_export_format(' JSONL ') == ExportFormats.jsonl
+    assert get_export_format('xml') is None
+
+
+def test_rows_are_written_as_json_lines():
+    rows = [
+        Row(item_text='написать код', item_created_dt=datetime(2021, 6, 9, 10, 0, tzinfo=pytz.utc), note_id=None),
+        Row(item_text='line\nbreak', item_created_dt=datetime(2021, 6, 10, 10, 0, tzinfo=pytz.utc), note_id=1),
+    ]
+    file = io.BytesIO()
+    size = asyncio.run(write_jsonl(iter_rows(rows), file))
+    lines = file.getvalue().decode('utf-8').splitlines()
+    assert size == len(file.getvalue())
+    assert [json.loads(line) for line in lines] == [
+        {'item_text': 'написать код', 'item_created_dt': '2021-06-09T10:00:00+00:00', 'note_id': None},
+        {'item_text': 'line\nbreak', 'item_created_dt': '2021-06-10T10:00:00+00:00', 'note_id': 1},
+    ]
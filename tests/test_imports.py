@@ -0,0 +1,52 @@
+import io
+import pytest
+from datetime import datetime
+import pytz
+from auxy.imports import HistoryFormatError, HistoryRow, iter_history_rows
+
+
+CSV_HEADER = b'period_bucket_key,item_id,item_text,item_status,item_created_dt,note_id,note_text,note_created_dt\n'
+
+
+def test_csv_written_by_copy_is_parsed():
+    history_file = io.BytesIO(
+        CSV_HEADER +
+        b'week-2021-1,7,"write code, docs",done,2021-01-04 10:00:00+00,3,"two\nlines",2021-01-05 10:00:00+00\n'
+        b'week-2021-1,8,\xd1\x82\xd0\xb5\xd1\x81\xd1\x82,active,2021-01-04 10:00:00+07,,,\n'
+    )
+    assert list(iter_history_rows(history_file)) == [
+        HistoryRow(
+            'week-2021-01', 7, 'write code, docs', 'done', datetime(2021, 1, 4, 10, tzinfo=pytz.utc),
+            3, 'two\nlines', datetime(2021, 1, 5, 10, tzinfo=pytz.utc),
+        ),
+        HistoryRow(
+            'week-2021-01', 8, 'тест', 'active', datetime(2021, 1, 4, 3, tzinfo=pytz.utc), None, None, None,
+        ),
+    ]
+
+
+def test_jsonl_is_parsed():
+    history_file = io.BytesIO(
+        b'{"period_bucket_key": "perpetual", "item_id": 1, "item_text": "a", "item_status": "rejected", '
+        b'"item_created_dt": "2021-01-04T10:00:00+00:00", "note_id": null, "note_text": null, '
+        b'"note_created_dt": null}\n'
+        b'\n'
+    )
+    assert [row.period_bucket_key for row in iter_history_rows(history_file, jsonl=True)] == ['perpetual']
+
+
+@pytest.mark.parametrize('history_file, line_num', [
+    (b'period_bucket_key,item_id\n', 1),
+    (CSV_HEADER + b'day-2021-01-01,1,a,active,2021-01-01 00:00:00+00,,,\nhour-1,2,b,active,2021-01-01 00:00:00+00,,,\n', 3),
+    (CSV_HEADER + b'day-2021-01-01,1,a,active,2021-01-01 00:00:00,,,\n', 2),
+    (CSV_HEADER + b'day-2021-01-01,1,a,active,2021-01-01 00:00:00+00,1,,\n', 2),
+])
+def test_wrong_rows_are_reported(history_file, line_num):
+    with pytest.raises(HistoryFormatError) as e:
+        list(iter_history_rows(io.BytesIO(history_file)))
+    assert e.value.line_num == line_num
+
+
+def test_binary_file_is_rejected():
+    with pytest.raises(HistoryFormatError):
+        list(iter_history_rows(io.BytesIO(b'\xff\xfe\x00'), jsonl=True))
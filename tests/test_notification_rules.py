@@ -0,0 +1,62 @@
+from datetime import datetime
+import pytest
+import pytz
+from dateutil.relativedelta import relativedelta
+from auxy.notification_rules import CronExpression, NotificationRule, get_notification_rule
+
+
+nsktz = pytz.timezone('Asia/Novosibirsk')
+
+
+def test_relativedelta_timings():
+    rule = NotificationRule([
+        {'hour': 18, 'minute': 0, 'second': 0, 'microsecond': 0},
+        {'days': 1, 'hour': 18, 'minute': 0, 'second': 0, 'microsecond': 0},
+    ])
+    assert rule.get_next(datetime(2021, 6, 11, 9, 0)) == datetime(2021, 6, 11, 18, 0)
+    assert rule.get_next(datetime(2021, 6, 11, 18, 0)) == datetime(2021, 6, 12, 18, 0)
+
+
+def test_no_future_timing():
+    rule = NotificationRule([{'hour': 1, 'minute': 0}])
+    assert rule.get_next(datetime(2021, 6, 11, 9, 0)) is None
+    assert NotificationRule([]).get_next(datetime(2021, 6, 11, 9, 0)) is None
+
+
+def test_cron_timings():
+    assert CronExpression('0 9 * * 1-5').get_next(datetime(2021, 6, 11, 9, 0)) == datetime(2021, 6, 14, 9, 0)
+    assert CronExpression('*/15 * * * *').get_next(datetime(2021, 12, 31, 23, 59)) == datetime(2022, 1, 1)
+    assert CronExpression('30 8,17 * * *').get_next(datetime(2021, 6, 11, 9, 0)) == datetime(2021, 6, 11, 17, 30)
+    assert CronExpression('0 0 29 2 *').get_next(datetime(2021, 3, 1)) == datetime(2024, 2, 29)
+    assert CronExpression('0 0 1 * 0').get_next(datetime(2021, 6, 1)) == datetime(2021, 6, 6)
+    assert CronExpression('0 0 31 2 *').get_next(datetime(2021, 3, 1)) is None
+    # odd days which are Mondays, not odd days or Mondays
+    assert CronExpression('0 9 */2 * 1').get_next(datetime(2021, 6, 11, 9, 0)) == datetime(2021, 6, 21, 9, 0)
+    with pytest.raises(ValueError):
+        CronExpression('0 25 * * *')
+
+
+def test_mixed_timings_keep_timezone():
+    rule = NotificationRule(['0 9 * * 1-5', {'days': 1, 'hour': 8, 'minute': 0, 'second': 0, 'microsecond': 0}])
+    assert rule.get_next(nsktz.localize(datetime(2021, 6, 11, 10, 0))) == nsktz.localize(datetime(2021, 6, 12, 8, 0))
+    assert rule.get_next(nsktz.localize(datetime(2021, 6, 11, 7, 0))) == nsktz.localize(datetime(2021, 6, 11, 9, 0))
+
+
+def test_rules_are_cached_by_settings():
+    timings = [{'hour': 9}]
+    assert get_notification_rule(1, 'todo_for_today', timings) is get_notification_rule(1, 'todo_for_today', timings)
+    assert get_notification_rule(1, 'todo_for_today', timings) is not get_notification_rule(1, 'todo_for_today', [])
+
+
+def test_time_shift_timings_match_relativedelta():
+    now = nsktz.localize(datetime(2021, 6, 11, 9, 41, 12, 5))
+    for timing in [{'hour': 18}, {'days': 1, 'hour': 9, 'minute': 30}, {'weeks': 1, 'minutes': 5}, {'weekday': 2}]:
+        assert NotificationRule([timing]).get_next(now) == now + relativedelta(**timing)
+
+
+def test_timings_keep_local_hour_across_dst():
+    berlin = pytz.timezone('Europe/Berlin')
+    rule = NotificationRule([{'days': 1, 'hour': 9, 'minute': 0, 'second': 0, 'microsecond': 0}])
+    next_dt = rule.get_next(berlin.localize(datetime(2021, 3, 27, 10, 0)))
+    assert next_dt == berlin.localize(datetime(2021, 3, 28, 9, 0))
+    assert next_dt.utcoffset().total_seconds() == 2 * 3600
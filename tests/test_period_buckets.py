@@ -1,12 +1,15 @@
-from auxy.utils import PeriodBucket, DailyBucket, WeeklyBucket, MonthlyBucket, YearlyBucket, PerpetualBucket
-from datetime import datetime
+import pytest
+import pytz
+from auxy.utils import PeriodBucket, DailyBucket, WorkingDaysBucket, WeeklyBucket, MonthlyBucket, YearlyBucket, \
+    PerpetualBucket, PeriodBucketModes
+from datetime import datetime, date
 
 
 def test_bucket_key():
     assert 'day-2021-01-01' == DailyBucket(datetime(2021, 1, 1, 12, 30, 15)).key()
     assert 'week-2020-53' == WeeklyBucket(datetime(2021, 1, 1, 12, 30, 15)).key()
-    assert 'week-2021-1' == WeeklyBucket(datetime(2021, 1, 4, 12, 30, 15)).key()
-    assert 'month-2021-1' == MonthlyBucket(datetime(2021, 1, 1, 12, 30, 15)).key()
+    assert 'week-2021-01' == WeeklyBucket(datetime(2021, 1, 4, 12, 30, 15)).key()
+    assert 'month-2021-01' == MonthlyBucket(datetime(2021, 1, 1, 12, 30, 15)).key()
     assert 'month-2021-12' == MonthlyBucket(datetime(2021, 12, 1, 12, 30, 15)).key()
     assert 'year-2021' == YearlyBucket(datetime(2021, 1, 1, 12, 30, 15)).key()
     assert 'perpetual' == PerpetualBucket('').key()
@@ -15,7 +18,69 @@ def test_bucket_key():
 def test_bucket_from_key():
     assert PeriodBucket.get_by_key('day-2021-01-01').start() == datetime(2021, 1, 1)
     assert PeriodBucket.get_by_key('week-2020-53').start() == datetime(2020, 12, 28)
+    assert PeriodBucket.get_by_key('week-2021-01').start() == datetime(2021, 1, 4)
     assert PeriodBucket.get_by_key('week-2021-1').start() == datetime(2021, 1, 4)
+    assert PeriodBucket.get_by_key('month-2021-01').start() == datetime(2021, 1, 1)
     assert PeriodBucket.get_by_key('month-2021-1').start() == datetime(2021, 1, 1)
     assert PeriodBucket.get_by_key('year-2021').start() == datetime(2021, 1, 1)
     assert PeriodBucket.get_by_key('perpetual').start() is None
+
+
+def test_bucket_keys_are_sorted_chronologically():
+    weeks = [WeeklyBucket(datetime(2021, 1, 4))]
+    months = [MonthlyBucket(datetime(2021, 1, 1))]
+    for _ in range(60):
+        weeks.append(weeks[-1].get_next())
+        months.append(months[-1].get_next())
+    assert sorted(weeks, key=lambda bucket: bucket.key()) == weeks
+    assert sorted(months, key=lambda bucket: bucket.key()) == months
+
+
+def test_bucket_keeps_timezone():
+    tz = pytz.timezone('Asia/Novosibirsk')
+    bucket = DailyBucket(tz.localize(datetime(2021, 6, 9, 23, 30)))
+    assert bucket.start() == tz.localize(datetime(2021, 6, 9))
+    assert bucket.get_next().end() == tz.localize(datetime(2021, 6, 11))
+    assert str(MonthlyBucket(tz.localize(datetime(2021, 2, 9)))) == '2021-02-01 / 2021-02-28'
+
+
+@pytest.mark.parametrize('mode', list(PeriodBucketModes))
+def test_bucket_of_date(mode):
+    # notifications build buckets of local dates rather than moments
+    bucket = PeriodBucket.new(mode, date(2021, 6, 9))
+    same_bucket = PeriodBucket.new(mode, datetime(2021, 6, 9, 18, 30))
+    assert bucket.key() == same_bucket.key()
+    assert bucket.start() == same_bucket.start()
+    assert bucket.end() == same_bucket.end()
+    assert bucket.get_next().key() == same_bucket.get_next().key()
+    assert bucket.is_valid() == same_bucket.is_valid()
+
+
+def test_working_days_skip_weekends():
+    friday = WorkingDaysBucket(datetime(2021, 6, 11, 18))
+    assert friday.is_valid()
+    assert friday.get_next().key() == 'day-2021-06-14'
+    assert not WorkingDaysBucket(datetime(2021, 6, 12)).is_valid()
+    assert WorkingDaysBucket(datetime(2021, 6, 13)).get_next().key() == 'day-2021-06-14'
+
+
+def test_yearly_bucket_covers_whole_year():
+    bucket = YearlyBucket(datetime(2021, 6, 9))
+    assert bucket.end() == datetime(2022, 1, 1)
+    assert bucket.get_next().key() == 'year-2022'
+
+
+def test_bucket_range():
+    start, end = WeeklyBucket(datetime(2020, 12, 20)), WeeklyBucket(datetime(2021, 1, 5))
+    assert [bucket.key() for bucket in PeriodBucket.range(start, end)] == ['week-2020-51', 'week-2020-52',
+                                                                           'week-2020-53', 'week-2021-01']
+    assert list(PeriodBucket.range(end, start)) == []
+    perpetual = PerpetualBucket('')
+    assert list(PeriodBucket.range(perpetual, perpetual)) == [perpetual]
+
+
+def test_wrong_bucket_keys():
+    for key in ['week-2021-00', 'week-2021-54', 'week-21-01', 'month-2021-13', 'day-2021-02-30', 'hour-1', 'day']:
+        with pytest.raises(ValueError):
+            PeriodBucket.get_by_key(key)
+    assert PeriodBucket.get_by_key('week-2021-01') is PeriodBucket.get_by_key('week-2021-01')
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+
+TEST_DATABASE_URI = os.environ.get('AUXY_TEST_DATABASE_URI')
+
+# the same lookups handlers and selectinload() make, on a database migrated to the head revision
+HOT_QUERIES = {
+    'projects by chat': 'SELECT * FROM projects WHERE chat_id = 1',
+    'items of lists': """
+        SELECT items.* FROM items_lists
+            JOIN item_in_list ON items_lists.id = item_in_list.list_id
+            JOIN items ON items.id = item_in_list.item_id
+        WHERE items_lists.id IN (1, 2, 3)
+    """,
+    'lists of an item': 'SELECT list_id FROM item_in_list WHERE item_id = 1',
+    'notes of items': 'SELECT * FROM item_notes WHERE item_id IN (1, 2, 3)',
+    'items lists of a period': """
+        SELECT * FROM items_lists WHERE project_id = 1 AND period_bucket_key = 'day-2021-06-09'
+    """,
+}
+
+
+async def get_plans():
+    engine = create_async_engine(TEST_DATABASE_URI)
+    plans = {}
+    try:
+        async with engine.connect() as connection:
+            # tables of a test database are tiny, so sequential scans are only taken when there is no index
+            await connection.execute(text('SET enable_seqscan = off'))
+            for name, query in HOT_QUERIES.items():
+                plan_result = await connection.execute(text('EXPLAIN ' + query))
+                plans[name] = '\n'.join(row[0] for row in plan_result)
+    finally:
+        await engine.dispose()
+    return plans
+
+
+@pytest.mark.skipif(TEST_DATABASE_URI is None, reason='AUXY_TEST_DATABASE_URI is not set')
+def test_hot_queries_use_indexes():
+    for name, plan in asyncio.run(get_plans()).items():
+        assert 'Seq Scan' not in plan, f'{name}:\n{plan}'
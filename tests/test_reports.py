@@ -0,0 +1,137 @@
+import asyncio
+import io
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from auxy.utils import ItemStatus
+from auxy.reports import ReportPeriods, ReportCalendar, BucketStats, get_report_period, get_report_entries, \
+    get_report_stats, render_status_report, render_status_report_async, write_status_report, render_project_stats, \
+    SpooledReportFile, ReportCache, write_status_report_pages
+
+
+ItemsList = namedtuple('ItemsList', ['period_bucket_key', 'items'])
+Item = namedtuple('Item', ['text', 'status', 'notes'])
+Note = namedtuple('Note', ['text'])
+
+
+def get_items_lists():
+    return [
+        ItemsList('day-2021-06-09', [
+            Item('write code', ItemStatus.done, [Note('done'), Note('tested')]),
+            Item('write docs', ItemStatus.active, []),
+        ]),
+        ItemsList('day-2021-06-10', []),
+    ]
+
+
+def get_report_data():
+    return get_report_stats(get_items_lists()), get_report_entries(get_items_lists())
+
+
+def test_status_report():
+    caption, report = render_status_report(datetime(2021, 6, 9), datetime(2021, 6, 15), date(2021, 6, 11), *get_report_data())
+    assert caption == 'Отчет о проделанной работе с 2021-06-09 по 2021-06-15\n' \
+                      'Выполнено: 1, отклонено: 0, в работе: 1, заметок: 2\n\nПн Вт Ср Чт Пт Сб Вс\n➖➖🟣🟣⬜⚫⚫\n⚪⚪➖➖➖➖➖'
+    assert report == '🗓 2021-06-09 📌 write code\n📎 done\n📎 tested\n\n🗓 2021-06-09 📌 write docs\n'
+
+
+def test_empty_status_report():
+    items_lists = [ItemsList('day-2021-06-10', [])]
+    caption, report = render_status_report(
+        datetime(2021, 6, 9), datetime(2021, 6, 15), date(2021, 6, 11),
+        get_report_stats(items_lists), get_report_entries(items_lists),
+    )
+    assert caption == 'В период с 2021-06-09 по 2021-06-15 получается пустой отчет о проделанной работе\n\n' \
+                      'Пн Вт Ср Чт Пт Сб Вс\n➖➖⚪🟣⬜⚫⚫\n⚪⚪➖➖➖➖➖'
+    assert report == ''
+
+
+def test_big_status_report_is_rendered_in_executor():
+    args = (datetime(2021, 6, 9), datetime(2021, 6, 15), date(2021, 6, 11), *get_report_data())
+    with ThreadPoolExecutor(1) as executor:
+        rendered = asyncio.run(render_status_report_async(*args, executor=executor, offload_threshold=1))
+    assert rendered == render_status_report(*args)
+
+
+def test_report_periods():
+    now = datetime(2021, 5, 19, 15, 30)
+    assert get_report_period(ReportPeriods.week, now) == (datetime(2021, 5, 19), datetime(2021, 5, 25))
+    assert get_report_period(ReportPeriods.month, now) == (datetime(2021, 5, 1), datetime(2021, 5, 31))
+    assert get_report_period(ReportPeriods.quarter, now) == (datetime(2021, 4, 1), datetime(2021, 6, 30))
+    assert get_report_period(ReportPeriods.year, now) == (datetime(2021, 1, 1), datetime(2021, 12, 31))
+
+
+def test_calendar_covers_whole_weeks():
+    calendar = ReportCalendar(date(2021, 5, 1), date(2021, 5, 31))
+    calendar.mark_planned(date(2021, 5, 31))
+    calendar.mark_planned(date(2021, 6, 1))
+    calendar.mark_today(date(2021, 5, 1))
+    weeks = calendar.get_weeks()
+    assert len(weeks) == 6
+    assert weeks[0] == ':minus::minus::minus::minus::minus::black_large_square::black_circle:'
+    assert weeks[-1] == ':purple_circle:' + ':minus:' * 6
+    assert len(ReportCalendar(date(2021, 1, 1), date(2021, 12, 31)).get_weeks()) == 53
+
+
+def test_report_is_written_to_spooled_file():
+    args = (datetime(2021, 6, 9), datetime(2021, 6, 15), date(2021, 6, 11), *get_report_data())
+    caption, report = render_status_report(*args)
+    with SpooledReportFile(16) as file:
+        assert write_status_report(*args, file) == (caption, len(report.encode('utf-8')))
+        assert file.read().decode('utf-8') == report
+        assert isinstance(file, io.IOBase)
+
+
+def test_report_is_written_page_by_page():
+    stats, entries = get_report_data()
+    entries = entries * 3
+    args = (datetime(2021, 6, 9), datetime(2021, 6, 15), date(2021, 6, 11), stats)
+    caption, report = render_status_report(*args, entries)
+
+    async def iter_pages():
+        for entry in entries:
+            yield [entry]
+
+    async def write(executor):
+        with SpooledReportFile(16) as file:
+            written = await write_status_report_pages(
+                *args, iter_pages(), file, executor=executor, offload_threshold=1
+            )
+            return written, file.read().decode('utf-8')
+
+    assert asyncio.run(write(None)) == ((caption, len(report.encode('utf-8'))), report)
+    with ThreadPoolExecutor(1) as executor:
+        assert asyncio.run(write(executor)) == ((caption, len(report.encode('utf-8'))), report)
+
+
+def test_report_cache_is_invalidated_by_data_version():
+    cache = ReportCache(2)
+    cache.put((1, 'week'), 1, 'caption', b'report')
+    assert cache.get((1, 'week'), 1) == ('caption', b'report')
+    assert cache.get((1, 'week'), 2) is None
+    assert cache.get((1, 'week'), 1) is None
+    cache.put((1, 'week'), 2, 'caption', b'report')
+    cache.put((2, 'week'), 1, 'caption', b'report')
+    cache.get((1, 'week'), 2)
+    cache.put((3, 'week'), 1, 'caption', b'report')
+    assert cache.get((2, 'week'), 1) is None
+    assert cache.get((1, 'week'), 2) is not None
+
+
+def test_project_stats_are_grouped_by_months_and_years():
+    stats = [
+        BucketStats('day-2021-05-31', 0, 1, 1, 0),
+        BucketStats('day-2021-06-09', 1, 1, 0, 2),
+        BucketStats('day-2021-06-10', 0, 0, 0, 0),
+        BucketStats('year-2020', 0, 2, 0, 1),
+        BucketStats('perpetual', 1, 0, 0, 0),
+    ]
+    assert render_project_stats(stats).split('\n') == [
+        'Статистика за все время:',
+        'периодов 5, пунктов 7 (1.4 за период), выполнено 57%, отклонено 14%, заметок 3',
+        '',
+        '2020: периодов 1, пунктов 2 (2.0 за период), выполнено 100%, отклонено 0%, заметок 1',
+        '2021-05: периодов 1, пунктов 2 (2.0 за период), выполнено 50%, отклонено 50%, заметок 0',
+        '2021-06: периодов 2, пунктов 2 (1.0 за период), выполнено 50%, отклонено 0%, заметок 2',
+    ]
+    assert render_project_stats(stats, max_groups=1).split('\n')[-1].startswith('2021-06:')
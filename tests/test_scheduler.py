@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime, timedelta
+from auxy.scheduler import NotificationScheduler, MisfirePolicy, resolve_misfire
+
+
+def test_pop_due_in_fire_time_order():
+    scheduler = NotificationScheduler()
+    now = datetime(2021, 6, 14, 9, 0)
+    scheduler.schedule(1, 'todo_for_today', now + timedelta(minutes=5))
+    scheduler.schedule(2, 'todo_for_today', now - timedelta(minutes=1))
+    scheduler.schedule(3, 'end_of_work_day', now)
+    assert scheduler.next_fire_at() == now - timedelta(minutes=1)
+    assert [(p, a) for _, p, a in scheduler.pop_due(now)] == [(2, 'todo_for_today'), (3, 'end_of_work_day')]
+    assert len(scheduler) == 1
+    assert scheduler.next_fire_at() == now + timedelta(minutes=5)
+
+
+def test_reschedule_and_unschedule():
+    scheduler = NotificationScheduler()
+    now = datetime(2021, 6, 14, 9, 0)
+    scheduler.schedule(1, 'todo_for_today', now)
+    scheduler.schedule(1, 'end_of_work_day', now)
+    scheduler.schedule(1, 'todo_for_today', now + timedelta(days=1))
+    assert scheduler.get_fire_time(1, 'todo_for_today') == now + timedelta(days=1)
+    assert [(p, a) for _, p, a in scheduler.pop_due(now)] == [(1, 'end_of_work_day')]
+    scheduler.unschedule(1)
+    assert len(scheduler) == 0
+    assert scheduler.next_fire_at() is None
+    assert scheduler.pop_due(now + timedelta(days=2)) == []
+
+
+def test_wait_is_woken_up_by_earlier_entry():
+    async def scenario():
+        scheduler = NotificationScheduler()
+        now = datetime(2021, 6, 14, 9, 0)
+        scheduler.schedule(1, 'todo_for_today', now + timedelta(hours=1))
+        waiter = asyncio.ensure_future(scheduler.wait(now))
+        await asyncio.sleep(0)
+        scheduler.schedule(2, 'todo_for_today', now)
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(scenario())
+
+
+def test_entries_beyond_window_are_not_kept():
+    scheduler = NotificationScheduler(timedelta(minutes=10))
+    now = datetime(2021, 6, 14, 9, 0)
+    assert scheduler.is_window_expired(now)
+    scheduler.move_window(now)
+    scheduler.schedule(1, 'todo_for_today', now + timedelta(minutes=5))
+    scheduler.schedule(2, 'todo_for_today', now + timedelta(minutes=15))
+    assert len(scheduler) == 1
+    assert not scheduler.is_window_expired(now + timedelta(minutes=5))
+    assert scheduler.is_window_expired(now + timedelta(minutes=10))
+
+
+def test_resolve_misfire():
+    now = datetime(2021, 6, 14, 9, 0)
+    grace = timedelta(minutes=1)
+    in_time = now - timedelta(seconds=30)
+    missed = now - timedelta(hours=3)
+    for policy in MisfirePolicy:
+        assert resolve_misfire(policy, in_time, now, grace) == (now, now)
+    assert resolve_misfire(MisfirePolicy.fire_late, missed, now, grace) == (missed, missed)
+    assert resolve_misfire(MisfirePolicy.coalesce, missed, now, grace) == (now, now)
+    assert resolve_misfire(MisfirePolicy.skip, missed, now, grace) == (None, now)
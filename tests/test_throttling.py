@@ -0,0 +1,58 @@
+import asyncio
+from aiogram.utils.exceptions import RetryAfter
+from auxy.throttling import TokenBucket, TelegramThrottler
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_delay():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert bucket.get_delay() == 0
+    assert bucket.get_delay() == 0
+    assert bucket.get_delay() == 0.5
+    clock.now = 0.5
+    assert bucket.get_delay() == 0
+    assert not bucket.is_idle()
+    clock.now = 10
+    assert bucket.is_idle()
+
+
+def test_token_bucket_pause():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, clock=clock)
+    bucket.pause(5)
+    assert bucket.get_delay() == 5
+    clock.now = 5
+    assert bucket.get_delay() == 1
+    clock.now = 6
+    assert bucket.get_delay() == 0
+
+
+def test_retry_after_pauses_only_affected_chat():
+    async def scenario():
+        throttler = TelegramThrottler(global_rate=1000, chat_rate=1000)
+        calls = []
+
+        async def flaky_request():
+            calls.append('flaky')
+            if len(calls) == 1:
+                raise RetryAfter(0.01)
+            return 'sent'
+
+        async def request():
+            return 'other'
+
+        assert await throttler.call(1, flaky_request) == 'sent'
+        assert calls == ['flaky', 'flaky']
+        assert throttler._get_chat_bucket(2).get_delay() == 0
+        assert await throttler.call(2, request) == 'other'
+
+    asyncio.run(scenario())
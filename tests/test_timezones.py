@@ -0,0 +1,32 @@
+from collections import namedtuple
+from datetime import datetime
+import pytz
+from auxy.timezones import to_local_times, group_by_wall_time, is_valid_timezone
+
+
+Project = namedtuple('Project', ['id', 'timezone'])
+
+
+def test_local_times_are_grouped_by_offset():
+    now = pytz.utc.localize(datetime(2021, 6, 11, 17, 30))
+    projects = [
+        Project(1, 'Asia/Novosibirsk'),
+        Project(2, 'Asia/Krasnoyarsk'),
+        Project(3, 'Asia/Irkutsk'),
+        Project(4, 'Europe/Moscow'),
+    ]
+    due = to_local_times([(project, now) for project in projects])
+    assert [local_dt for _, local_dt in due] == [now] * 4
+    assert due[1][1].tzinfo.zone == 'Asia/Krasnoyarsk'
+    groups = group_by_wall_time(due)
+    assert groups == {
+        datetime(2021, 6, 12, 1, 30): [projects[2]],
+        datetime(2021, 6, 12, 0, 30): [projects[0], projects[1]],
+        datetime(2021, 6, 11, 20, 30): [projects[3]],
+    }
+
+
+def test_timezone_validation():
+    assert is_valid_timezone('Europe/Berlin')
+    assert not is_valid_timezone('Mars/Olympus')
+    assert not is_valid_timezone(7)
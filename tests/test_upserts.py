@@ -0,0 +1,44 @@
+import asyncio
+import os
+from datetime import datetime
+import pytest
+import pytz
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+
+TEST_DATABASE_URI = os.environ.get('AUXY_TEST_DATABASE_URI')
+USER_ID = -1001
+
+
+async def upsert_user(engine, **values):
+    from auxy.db.models import User
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user, inserted = await User.upsert(session, id=USER_ID, joined_dt=datetime.now(pytz.utc), **values)
+        await session.commit()
+        return user, inserted
+
+
+async def upsert_concurrently():
+    # importing models configures the bot from the environment, which is only set up along with a test database
+    from auxy.db.models import User
+    engine = create_async_engine(TEST_DATABASE_URI)
+    try:
+        async with engine.begin() as connection:
+            await connection.execute(delete(User).where(User.id == USER_ID))
+        created = await asyncio.gather(*(upsert_user(engine, username='first') for _ in range(5)))
+        updated = await upsert_user(engine, username='renamed', first_name='Name')
+        async with engine.begin() as connection:
+            await connection.execute(delete(User).where(User.id == USER_ID))
+    finally:
+        await engine.dispose()
+    return created, updated
+
+
+@pytest.mark.skipif(TEST_DATABASE_URI is None, reason='AUXY_TEST_DATABASE_URI is not set')
+def test_concurrent_upserts_insert_once():
+    created, (user, inserted) = asyncio.run(upsert_concurrently())
+    assert [inserted for _, inserted in created].count(True) == 1
+    assert not inserted
+    assert (user.username, user.first_name) == ('renamed', 'Name')
+    assert user.joined_dt == created[0][0].joined_dt